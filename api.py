@@ -1,223 +1,957 @@
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import RedirectResponse
-from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException, Header, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, PlainTextResponse, RedirectResponse, Response, StreamingResponse
+from pydantic import BaseModel, ValidationError, model_validator
+from starlette.requests import ClientDisconnect
+from typing import List, Optional
 import numpy as np
-from stable_baselines3 import PPO
-from env import TravelCostEnv
+from numpy_policy import load_policy
+from checkpoints import latest_checkpoint
+from features import encode_request, encode_requests
+from batching import MicroBatcher
+from inference import InferenceExecutor, InferenceOverloaded, policy_costs
+from quote_table import QuoteTable
+from prediction_cache import PredictionCache
+from single_flight import SingleFlight
+import codec
+from model_supervisor import ModelHandle, ModelSupervisor
+from circuit_breaker import CircuitBreaker
+from distance_matrix import ROUTE_FIELDS, DistanceMatrix
+from structured_log import LogPipeline, StageTimer
+import metrics
+import asyncio
+import logging
 import os
+import re
+import secrets
+import time
 import uvicorn
 from contextlib import asynccontextmanager
 
+# JSON lines written by a background thread (see structured_log.py). Per-request
+# records are sampled with LOG_SAMPLE_RATE; warnings and errors are always kept.
+log_pipeline = LogPipeline(
+    level=os.environ.get("LOG_LEVEL", "INFO"),
+    sample_rate=float(os.environ.get("LOG_SAMPLE_RATE", 0.1)),
+    max_queue=int(os.environ.get("LOG_QUEUE_SIZE", 10000)),
+)
+log_pipeline.configure()
+logger = logging.getLogger("api")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Load the model on startup
-    load_model()
+    # The model is loaded and warmed up by a background supervisor so the server
+    # accepts connections immediately; /readyz turns green once it is done and
+    # /predict uses the heuristic fallback until then.
+    log_pipeline.start()
+    executor.start()
+    batcher.start()
+    supervisor.start()
+    loop_lag_monitor.start()
     yield
     # Clean up on shutdown if needed
-    print("Shutting down API...")
+    logger.info("Shutting down API...")
+    await loop_lag_monitor.stop()
+    supervisor.stop()
+    await batcher.stop()
+    executor.shutdown()
+    log_pipeline.stop()
 
 app = FastAPI(title="Cameroon Travel Cost Predictor API", lifespan=lifespan)
 
+class PinModelVersion:
+    """
+    Pin each request to the model served when it arrives, so a hot reload never
+    changes the model under an in-flight request, and report it in X-Model-Version.
+
+    Also records the request metrics. Handlers mark their stages on
+    request.state.timer; everything after the handler returns (response
+    rendering and sending) is charged to the "serialize" stage.
+
+    Plain ASGI middleware: @app.middleware("http") would run every request in an
+    extra task and copy the response body through a memory stream.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        timer = StageTimer()
+        handle = supervisor.current
+        state = scope.setdefault("state", {})
+        state["model_handle"] = handle
+        state["timer"] = timer
+        version = (handle.version if handle is not None else "heuristic").encode("latin-1")
+        status = 500
+
+        async def send_with_version(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = [*message.get("headers", ()), (b"x-model-version", version)]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_version)
+        finally:
+            path = scope["path"]
+            endpoint = path if path in INSTRUMENTED_PATHS else "other"
+            if timer.stages:
+                timer.mark("serialize")
+                for stage, seconds in timer.stages.items():
+                    stage_duration.observe(seconds, endpoint, stage)
+            requests_total.inc(endpoint, str(status))
+            request_duration.observe(time.perf_counter() - timer.started, endpoint)
+
+            fields = state.get("log_fields")
+            if fields is not None and log_pipeline.sampled() and logger.isEnabledFor(logging.INFO):
+                logger.info(fields["event"], extra={**fields, "status": status, "latency_ms": timer.as_dict()})
+
+app.add_middleware(PinModelVersion)
+
 class PredictionRequest(BaseModel):
-    distance_km: float
-    etat_route: str  # "mvan", "bonne", "mauvaise" ? No, frontend sends: "bonne", "moyenne", "mauvaise"
+    # distance_km, etat_route and routes_larges may be left out when depart_osm and
+    # destination_osm are sent: they are then read from the O/D matrix (see distance_matrix.py)
+    distance_km: Optional[float] = None
+    etat_route: Optional[str] = None  # "bonne", "moyenne", "mauvaise"
     heure: str # "14:00"
     jour_semaine: str # "lundi", ...
     pluie: str # "0", "0.5", "1"
     bagages: str # "oui", "non"
-    routes_larges: str # "oui", "non"
+    routes_larges: Optional[str] = None # "oui", "non"
     routes_travaux: str # "oui", "non"
     accident: str # "0", "1"
-    # depart_osm, destination_osm are not needed for the RL model logic unless we used them for geocoding, 
-    # but the frontend sends distance_km already calculated.
+    depart_osm: Optional[str] = None
+    destination_osm: Optional[str] = None
+
+    @model_validator(mode="after")
+    def fill_route(self):
+        missing = [field for field in ROUTE_FIELDS if getattr(self, field) is None]
+        if not missing:
+            return self
+        if self.depart_osm is None or self.destination_osm is None:
+            raise ValueError(f"{', '.join(missing)} required unless depart_osm and destination_osm are given")
+        if od_matrix is None:
+            raise ValueError("origin/destination pricing is not enabled on this server, send distance_km")
+        # Same rule as api_std.py: each missing field comes from the matrix, sent ones are kept
+        route = od_matrix.complete_payload(self.model_dump(include={*ROUTE_FIELDS, "depart_osm", "destination_osm"}))
+        for field in missing:
+            setattr(self, field, route[field])
+        return self
+
+# Fast path (see codec.py): the usual payload is checked against these rules;
+# O/D requests, coercions and invalid payloads go through pydantic
+prediction_request_rules = codec.CompiledValidator(PredictionRequest, required=ROUTE_FIELDS)
+PREDICTION_REQUEST_SCHEMA = PredictionRequest.model_json_schema()
+
+def parse_prediction_request(payload):
+    """Validated request from a decoded JSON payload. Raises ValidationError."""
+    request = prediction_request_rules.check(payload)
+    if request is None:
+        request = PredictionRequest.model_validate(payload)
+    return request
+
+async def read_json_body(http_request: Request):
+    """Decoded request body, with FastAPI's 422 format for a missing or malformed body."""
+    body = await http_request.body()
+    if not body:
+        raise RequestValidationError([{"type": "missing", "loc": ("body",), "msg": "Field required", "input": None}])
+    try:
+        return codec.loads(body)
+    except ValueError as e: # codec.JSONDecodeError, or invalid UTF-8 with the stdlib codec
+        raise RequestValidationError([{
+            "type": "json_invalid", "loc": ("body", getattr(e, "pos", 0)), "msg": "JSON decode error",
+            "input": {}, "ctx": {"error": str(e)},
+        }])
+
+def body_validation_error(e: ValidationError) -> RequestValidationError:
+    return RequestValidationError([{**err, "loc": ("body", *err["loc"])} for err in e.errors(include_url=False)])
+
+def json_response(content) -> Response:
+    """Response written straight to bytes: no response_model validation or jsonable_encoder pass."""
+    return Response(codec.dumps(content), media_type="application/json")
 
 class PredictionResponse(BaseModel):
     prix_estime_fcfa: float
     prix_estime_range: str
     message: str
+    fallback: bool = False # True when the price is the heuristic estimate, not the model's
+    fallback_reason: Optional[str] = None # model_loading, circuit_open, deadline, inference_error
+
+class BatchPredictionItem(BaseModel):
+    index: int # position of the item in the request list
+    prix_estime_fcfa: Optional[float] = None
+    prix_estime_range: Optional[str] = None
+    message: str
+    error: Optional[str] = None
+    fallback: bool = False
+    fallback_reason: Optional[str] = None
+
+class BatchPredictionResponse(BaseModel):
+    results: List[BatchPredictionItem]
+    count: int
+    errors: int
+
+# Upper bound on the number of quotes accepted in one /predict/batch call
+MAX_BATCH_ITEMS = int(os.environ.get("MAX_BATCH_ITEMS", 1000))
+# /predict/stream scores its records STREAM_CHUNK_SIZE at a time; a record longer
+# than MAX_STREAM_LINE_BYTES ends the stream
+STREAM_CHUNK_SIZE = int(os.environ.get("STREAM_CHUNK_SIZE", 512))
+MAX_STREAM_LINE_BYTES = int(os.environ.get("MAX_STREAM_LINE_BYTES", 64 * 1024))
+
+# Policy outputs precomputed over the discrete feature grid (see quote_table.py)
+QUOTE_TABLE_ENABLED = os.environ.get("QUOTE_TABLE", "1") == "1"
+QUOTE_TABLE_STEP_KM = float(os.environ.get("QUOTE_TABLE_STEP_KM", 1.0))
+# Hot reload: polling interval of the model directories (0 disables) and the
+# token required by POST /admin/reload (endpoint disabled when unset)
+MODEL_WATCH_INTERVAL_SECONDS = float(os.environ.get("MODEL_WATCH_INTERVAL_SECONDS", 10))
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+ONLINE_MODELS_ENABLED = os.environ.get("ONLINE_MODELS", "0") == "1"
+ONLINE_MODELS_DIR = "online_learning_data"
+
+# Distance upper bound declared by TravelCostEnv.observation_space
+MAX_DISTANCE_KM = 1000.0
+
+# LRU/TTL cache of policy outputs in front of inference (see prediction_cache.py)
+cache = PredictionCache(
+    max_entries=int(os.environ.get("CACHE_MAX_ENTRIES", 10000)),
+    ttl_seconds=float(os.environ.get("CACHE_TTL_SECONDS", 3600)),
+    distance_resolution_km=float(os.environ.get("CACHE_DISTANCE_RESOLUTION_KM", 0.1)),
+)
+
+# Identical /predict observations arriving while the first one is still being
+# scored share its forward pass instead of queueing their own (see single_flight.py)
+SINGLE_FLIGHT = os.environ.get("SINGLE_FLIGHT", "1") == "1"
+single_flight = SingleFlight()
+
+# The forward pass runs in a bounded thread or process pool, off the event loop (see inference.py)
+executor = InferenceExecutor(
+    kind=os.environ.get("INFERENCE_EXECUTOR", "thread"),
+    workers=int(os.environ.get("INFERENCE_WORKERS", 1)),
+    max_pending=int(os.environ.get("INFERENCE_MAX_PENDING", 32)),
+)
+
+async def run_policy(obs: np.ndarray, handle: ModelHandle) -> np.ndarray:
+    """Score a batch with the model handle its requests were pinned to."""
+    return await executor.run(obs, handle.policy)
 
-# Global model variable
-model = None
+# Concurrent /predict calls are coalesced into one forward pass (see batching.py)
+batcher = MicroBatcher(
+    run_policy,
+    max_batch_size=int(os.environ.get("BATCH_MAX_SIZE", 64)),
+    max_wait_ms=float(os.environ.get("BATCH_MAX_WAIT_MS", 2.0)),
+    max_queue=int(os.environ.get("BATCH_MAX_QUEUE", 1024)),
+)
 
-def get_latest_model():
+# Seconds a client is asked to wait before retrying a shed request
+RETRY_AFTER_SECONDS = int(os.environ.get("RETRY_AFTER_SECONDS", 1))
+
+# Latency budget of a request, counted from its arrival. A client may ask for
+# another budget with the X-Latency-Budget-Ms header, capped at INFERENCE_BUDGET_MAX_MS.
+# Inference that does not finish in time is answered with the heuristic.
+INFERENCE_BUDGET_MS = float(os.environ.get("INFERENCE_BUDGET_MS", 200))
+INFERENCE_BUDGET_MAX_MS = float(os.environ.get("INFERENCE_BUDGET_MAX_MS", 2000))
+
+# Origin/destination mode: requests may send depart_osm/destination_osm instead
+# of distance_km. Built offline with `python distance_matrix.py build`; the
+# matrix files are memory-mapped, so workers share them through the page cache.
+od_matrix = DistanceMatrix.open_if_present(os.environ.get("OD_MATRIX_DIR", "od_matrix"))
+
+# Sends traffic straight to the heuristic while inference is failing or slow (see circuit_breaker.py)
+breaker = CircuitBreaker(
+    window=int(os.environ.get("BREAKER_WINDOW", 50)),
+    min_calls=int(os.environ.get("BREAKER_MIN_CALLS", 20)),
+    failure_rate=float(os.environ.get("BREAKER_FAILURE_RATE", 0.5)),
+    slow_call_seconds=float(os.environ.get("BREAKER_SLOW_CALL_MS", 100)) / 1000,
+    slow_call_rate=float(os.environ.get("BREAKER_SLOW_CALL_RATE", 0.5)),
+    open_seconds=float(os.environ.get("BREAKER_OPEN_SECONDS", 5)),
+    half_open_calls=int(os.environ.get("BREAKER_HALF_OPEN_CALLS", 5)),
+)
+
+# Prometheus metrics served on GET /metrics (see metrics.py)
+registry = metrics.Registry()
+requests_total = registry.counter("api_requests_total", "HTTP requests by endpoint and status code.", ("endpoint", "status"))
+request_duration = registry.histogram("api_request_duration_seconds", "End-to-end request latency.", ("endpoint",))
+stage_duration = registry.histogram(
+    "api_stage_duration_seconds",
+    "Request latency by stage: parse (body parsing and pydantic validation), encode, lookup, inference, fallback, serialize.",
+    ("endpoint", "stage"),
+)
+predictions_total = registry.counter(
+    "api_predictions_total",
+    "Quotes served by source: quote_table, cache, model, or heuristic (fallback).",
+    ("endpoint", "source"),
+)
+inference_errors_total = registry.counter("api_inference_errors_total", "Inference failures answered with the heuristic fallback.", ("endpoint",))
+fallback_total = registry.counter(
+    "api_fallback_total",
+    "Quotes answered with the heuristic, by reason: model_loading, circuit_open, deadline, inference_error.",
+    ("endpoint", "reason"),
+)
+shed_total = registry.counter("api_shed_requests_total", "Requests rejected with 503 because inference was overloaded.")
+loop_lag = registry.histogram("api_event_loop_lag_seconds", "Delay of event loop wake-ups.", buckets=metrics.LAG_BUCKETS)
+loop_lag_monitor = metrics.EventLoopLagMonitor(loop_lag, interval=float(os.environ.get("LOOP_LAG_INTERVAL_SECONDS", 0.5)))
+registry.gauge("api_event_loop_lag_last_seconds", "Delay of the latest event loop wake-up.", fn=lambda: loop_lag_monitor.last_lag)
+registry.gauge(
+    "api_model_info", "Model version being served (value 1).", ("version",),
+    fn=lambda: {(supervisor.current.version if supervisor.current else "heuristic",): 1},
+)
+registry.gauge("api_model_ready", "1 once a model is loaded and warmed up.", fn=lambda: int(supervisor.current is not None))
+registry.stats("api_model", "Model supervisor", lambda: supervisor.stats(), counters=("attempts", "failures", "swaps"))
+registry.stats("api_breaker", "Inference circuit breaker", lambda: breaker.stats(), counters=("times_opened", "rejected"))
+registry.stats(
+    "api_od_matrix", "O/D distance matrix", lambda: od_matrix.stats() if od_matrix is not None else {}, counters=("lookups", "misses")
+)
+registry.stats("api_batcher", "Micro-batcher", lambda: batcher.stats(), counters=("batches", "items", "failed_batches"))
+registry.stats("api_executor", "Inference executor", lambda: executor.stats(), counters=("completed", "rejected"))
+registry.stats(
+    "api_cache", "Prediction cache", lambda: cache.stats(),
+    counters=("hits", "misses", "evictions", "expirations", "invalidations"),
+)
+registry.stats("api_single_flight", "In-flight deduplication of /predict", lambda: single_flight.stats(), counters=("leaders", "collapsed"))
+registry.stats("api_logging", "Log pipeline", lambda: log_pipeline.stats(), counters=("dropped",))
+metrics.register_process_metrics(registry)
+
+def overloaded_error(e: Exception) -> HTTPException:
+    shed_total.inc()
+    logger.warning("Shedding load: %s", e or "request queue full")
+    return HTTPException(
+        status_code=503,
+        detail="Service surchargé, veuillez réessayer",
+        headers={"Retry-After": str(RETRY_AFTER_SECONDS)},
+    )
+
+def get_latest_model(verbose=True):
     models_dir = "models/PPO"
-    print(f"DEBUG: Current Working Directory: {os.getcwd()}")
-    print(f"DEBUG: Checking directory {models_dir} (Absolute: {os.path.abspath(models_dir)})")
+    if verbose:
+        logger.debug("Current Working Directory: %s", os.getcwd())
+        logger.debug("Checking directory %s (Absolute: %s)", models_dir, os.path.abspath(models_dir))
     
     if not os.path.exists(models_dir):
-        print(f"DEBUG: Directory {models_dir} does NOT exist.")
-        return None
+        if verbose:
+            logger.warning("Directory %s does NOT exist.", models_dir)
+        return get_latest_online_update()
     
     files = os.listdir(models_dir)
-    print(f"DEBUG: Files in {models_dir}: {files}")
+    if verbose:
+        logger.debug("Files in %s: %s", models_dir, files)
     
     models = [f for f in files if f.endswith('.zip')]
     if not models:
-        print(f"DEBUG: No .zip files found in {models_dir}")
+        if verbose:
+            logger.warning("No .zip files found in %s", models_dir)
+        return get_latest_online_update()
+    
+    # Same choice as api_std.py, predict.py and the trainers (see checkpoints.py)
+    latest_path = latest_checkpoint(models_dir)
+    if verbose:
+        logger.info("Latest model selected: %s", os.path.basename(latest_path))
+    
+    # Online learning updates are fine-tunings of a PPO checkpoint: serve the
+    # newest one if it was written after the PPO checkpoint
+    online = get_latest_online_update()
+    if online and os.path.getmtime(online) > os.path.getmtime(latest_path):
+        if verbose:
+            logger.info("Newer online learning update selected: %s", online)
+        return online
+    return latest_path
+
+def get_latest_online_update():
+    """Highest online_learning_data/model_update_N.zip, when ONLINE_MODELS=1."""
+    if not ONLINE_MODELS_ENABLED or not os.path.isdir(ONLINE_MODELS_DIR):
         return None
+    updates = []
+    for f in os.listdir(ONLINE_MODELS_DIR):
+        match = re.fullmatch(r'model_update_(\d+)\.zip', f)
+        if match:
+            updates.append((int(match.group(1)), f))
+    if not updates:
+        return None
+    return os.path.join(ONLINE_MODELS_DIR, max(updates)[1])
+
+def resolve_admin_model_path(model_path: str) -> str:
+    """Only checkpoints inside the served model directories can be loaded through /admin/reload."""
+    real = os.path.realpath(model_path)
+    allowed = [os.path.realpath("models/PPO"), os.path.realpath(ONLINE_MODELS_DIR)]
+    if not real.endswith(".zip") or not any(real.startswith(d + os.sep) for d in allowed):
+        raise HTTPException(status_code=400, detail="model_path must be a .zip inside models/PPO or online_learning_data")
+    if not os.path.isfile(real):
+        raise HTTPException(status_code=404, detail=f"Checkpoint not found: {model_path}")
+    return model_path
+
+def build_model_handle(model_path: str) -> ModelHandle:
+    """Load a checkpoint, build its quote table and warm it up. Runs in the supervisor thread."""
+    logger.info("Attempting to load model from %s", model_path)
+    started = time.perf_counter()
+    # Uses the exported NumPy policy (no torch) when available, see numpy_policy.py
+    policy = load_policy(model_path)
+    logger.info("Inference backend: %s", type(policy).__name__)
     
-    # Improved sorting: find the one with the highest numerical value, ignoring prefixes
-    def extract_number(filename):
-        import re
-        nums = re.findall(r'\d+', filename)
-        val = int(nums[0]) if nums else 0
-        # Prioritize 'improved' if values are equal
-        bonus = 0.5 if "improved" in filename else 0
-        return val + bonus
-
-    models.sort(key=extract_number)
-    latest = models[-1]
-    print(f"DEBUG: Latest model selected: {latest}")
-    return os.path.join(models_dir, latest)
-
-def load_model():
-    global model
-    model_path = get_latest_model()
-    if model_path:
-        print(f"DEBUG: Attempting to load model from {model_path}")
+    table = None
+    if QUOTE_TABLE_ENABLED:
         try:
-            env = TravelCostEnv() 
-            model = PPO.load(model_path, env=env)
-            print("DEBUG: Model loaded successfully into memory.")
+            table = QuoteTable.build(policy, distance_step=QUOTE_TABLE_STEP_KM, max_distance=MAX_DISTANCE_KM)
         except Exception as e:
-            print(f"DEBUG: Failed to load model: {e}")
-            import traceback
-            traceback.print_exc()
-    else:
-        print("DEBUG: get_latest_model() returned None. No model to load.")
+            logger.warning("Quote table disabled, build failed: %s", e)
+    
+    warm_up(policy)
+    logger.info("Model loaded and warmed up in %.2fs", time.perf_counter() - started)
+    return ModelHandle(
+        policy=policy,
+        path=model_path,
+        # A new file or a retrained checkpoint both invalidate the prediction cache
+        version=f"{os.path.basename(model_path)}@{int(os.path.getmtime(model_path))}",
+        quote_table=table,
+    )
+
+def warm_up(policy):
+    """Run synthetic batches through the policy so lazy initialisation is not paid by the first request."""
+    rng = np.random.default_rng(0)
+    for size in (1, batcher.max_batch_size):
+        obs = np.column_stack([
+            rng.uniform(1, 500, size),
+            rng.integers(0, 3, size), rng.integers(0, 3, size),
+            rng.choice([0.0, 0.5, 1.0], size),
+            rng.integers(0, 2, (size, 4)),
+        ]).astype(np.float32)
+        policy_costs(policy, obs)
 
+# Loads the model in the background, retries with exponential backoff while no
+# checkpoint can be loaded and keeps the last-known-good model (see model_supervisor.py).
+# The request path only ever reads supervisor.current.
+# It also polls for new checkpoints and hot-swaps them in.
+supervisor = ModelSupervisor(
+    lambda: get_latest_model(verbose=supervisor.current is None),
+    build_model_handle,
+    on_swap=lambda handle: executor.use_model(handle.path),
+    retry_initial=float(os.environ.get("MODEL_RETRY_INITIAL_SECONDS", 1)),
+    retry_max=float(os.environ.get("MODEL_RETRY_MAX_SECONDS", 300)),
+    watch_interval=MODEL_WATCH_INTERVAL_SECONDS,
+)
 
 @app.get("/", include_in_schema=False)
 async def root():
     return RedirectResponse(url="/docs")
 
-@app.post("/predict", response_model=PredictionResponse)
-async def predict(request: PredictionRequest):
-    global model
-    if not model:
-        # Try to load again just in case
-        load_model()
-        if not model:
-            print("WARNING: Model still not loaded. Using heuristic fallback.")
-            # We don't raise 503 anymore, we use a fallback to keep the service alive.
-            pass
-
-    # 1. Map inputs to model observation
-    # Model inputs: distance, road_type, traffic, rain, night, accident, luggage, wide_road
-    
-    # Distance
-    distance = request.distance_km
-    
-    # Road Type
-    # "bonne" -> 0 (Paved), "moyenne" -> 1 (Dirt), "mauvaise" -> 2 (Broken)
-    # Frontend sends: "bonne", "moyenne", "mauvaise"
-    road_map = {"bonne": 0, "moyenne": 1, "mauvaise": 2}
-    # Use .strip() to handle spaces like " bonne"
-    road_type_str = request.etat_route.lower().strip()
-    road_type = road_map.get(road_type_str, 1) # default medium
+@app.get("/healthz", include_in_schema=False)
+async def healthz():
+    """Liveness: the process is up and the event loop responds."""
+    return {"status": "ok"}
+
+@app.get("/readyz", include_in_schema=False)
+async def readyz():
+    """Readiness: the model is loaded and warmed up."""
+    handle = supervisor.current
+    if handle is not None:
+        return {"status": "ready", "model_version": handle.version}
+    return JSONResponse(status_code=503, content={"status": supervisor.state, "error": supervisor.last_error})
+
+def heuristic_costs(obs: np.ndarray) -> np.ndarray:
+    """
+    HEURISTIC FALLBACK (based on simulation logic), vectorized over an (N, 8) observation matrix.
+    """
+    distance, road_type, traffic = obs[:, 0], obs[:, 1], obs[:, 2]
+    is_night, has_luggage, is_wide_road = obs[:, 4], obs[:, 6], obs[:, 7]
     
-    # Rain
-    # Frontend sends "0", "0.5", "1" or similar strings?
+    base_rate = 150 # CFA per km
+    cost = distance.astype(np.float64) * base_rate
+    cost = np.where(road_type == 1, cost * 1.2, cost)
+    cost = np.where(road_type == 2, cost * 1.5, cost)
+    cost = np.where(traffic == 1, cost * 1.3, cost)
+    cost = np.where(traffic == 2, cost * 1.7, cost)
+    cost = np.where(is_night == 1, cost * 1.2, cost)
+    cost = np.where(has_luggage == 1, cost + 500, cost)
+    cost = np.where(is_wide_road == 1, cost * 0.9, cost)
+    return np.maximum(500, cost) # Minimum fare 500
+
+def format_range(predicted_cost: float) -> str:
+    cost_min = int(predicted_cost * 0.9)
+    cost_max = int(predicted_cost * 1.1)
+    return f"{cost_min} - {cost_max} FCFA"
+
+def request_budget(http_request: Request) -> float:
+    """Latency budget of the request in seconds (INFERENCE_BUDGET_MS or the X-Latency-Budget-Ms header)."""
+    budget_ms = INFERENCE_BUDGET_MS
+    header = http_request.headers.get("x-latency-budget-ms")
+    if header:
+        try:
+            budget_ms = min(max(float(header), 0.0), INFERENCE_BUDGET_MAX_MS)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="X-Latency-Budget-Ms must be a number of milliseconds")
+    return budget_ms / 1000
+
+def request_deadline(http_request: Request) -> float:
+    """perf_counter() time by which the request must have its answer."""
+    return http_request.state.timer.started + request_budget(http_request)
+
+async def infer_within_budget(run, deadline: float, endpoint: str, flight_key=None):
+    """
+    Await run() under the circuit breaker and the request deadline.
+
+    Returns (result, None), or (None, reason) when the heuristic must answer.
+    Overload errors are re-raised (503) and do not count against the model;
+    every other call let through by the breaker is reported back to it.
+
+    With a flight_key, run() is shared with the identical calls in flight
+    (see single_flight.py). Only the call that starts it goes through the
+    breaker and reports its outcome: a collapsed burst is one model call, the
+    requests joining it just wait for it within their own deadline.
+    """
+    started = time.perf_counter()
+    if deadline <= started:
+        return None, "deadline"
+    shared = single_flight.join(flight_key) if flight_key is not None else None
+    leader = shared is None
+    if leader and not breaker.allow():
+        return None, "circuit_open"
+    ok = False
     try:
-        rain = float(request.pluie)
-    except:
-        rain = 0.0
-        
-    # Accident
-    accident = 1 if str(request.accident) == "1" else 0
-    
-    # Luggage
-    has_luggage = 1 if request.bagages.lower() == "oui" else 0
-    
-    # Wide Road
-    # Wide road helps traffic flow.
-    is_wide_road = 1 if request.routes_larges.lower() == "oui" else 0
-    
-    # Night
-    # Parse hour
+        if leader and flight_key is not None:
+            shared = single_flight.start(flight_key, run)
+        # shield: a request giving up does not cancel the call for the others
+        result = await asyncio.wait_for(asyncio.shield(shared) if shared is not None else run(), deadline - started)
+        ok = True
+        return result, None
+    except asyncio.TimeoutError:
+        return None, "deadline"
+    except (InferenceOverloaded, asyncio.QueueFull):
+        ok = None
+        if leader:
+            breaker.release()
+        raise
+    except Exception as e:
+        # Only this request falls back: the model stays in service for the others
+        logger.warning("Inference failed, using heuristic fallback: %s", e, exc_info=True)
+        inference_errors_total.inc(endpoint)
+        return None, "inference_error"
+    finally:
+        if ok is not None and leader:
+            breaker.record(ok, time.perf_counter() - started)
+
+def observation_flight_key(obs: np.ndarray, handle: ModelHandle):
+    """Single-flight key of a /predict forward pass (None when SINGLE_FLIGHT is off)."""
+    if not SINGLE_FLIGHT:
+        return None
+    return (handle.version, obs.tobytes())
+
+@app.post(
+    "/predict",
+    response_model=PredictionResponse,
+    responses={422: {"description": "Validation Error"}},
+    openapi_extra={"requestBody": {"required": True, "content": {"application/json": {"schema": PREDICTION_REQUEST_SCHEMA}}}},
+)
+async def predict(http_request: Request):
+    timer = http_request.state.timer
     try:
-        hour_int = int(request.heure.split(":")[0])
-    except:
-        hour_int = 12
-    
-    is_night = 1 if (hour_int >= 19 or hour_int < 6) else 0
+        request = parse_prediction_request(await read_json_body(http_request))
+    except ValidationError as e:
+        raise body_validation_error(e)
+    timer.mark("parse")
+    deadline = request_deadline(http_request)
+    handle = http_request.state.model_handle
+    # Without a model we don't raise 503, we use the heuristic fallback to keep the service alive.
+
+    # 1. Map inputs to model observation (see features.py)
+    obs = encode_request(request)
+    timer.mark("encode")
     
-    # Traffic
-    # Frontend doesn't send traffic level directly. We infer it.
-    # Weekday + Rush Hour = High
-    # Weekday + Normal = Medium
-    # Night/Weekend = Low
-    # This is a simple heuristic mapping.
+    # Predict
+    predicted_cost = None
+    source = "heuristic"
+    fallback_reason = "model_loading"
+    if handle is not None:
+        if handle.quote_table is not None:
+            predicted_cost = handle.quote_table.lookup_one(obs)
+            source = "quote_table"
+        if predicted_cost is None:
+            predicted_cost = cache.get(obs, handle.version)
+            source = "cache"
+        timer.mark("lookup")
+        if predicted_cost is None:
+            try:
+                predicted_cost, fallback_reason = await infer_within_budget(
+                    lambda: batcher.submit(obs, handle), deadline, "/predict", observation_flight_key(obs, handle)
+                )
+            except (InferenceOverloaded, asyncio.QueueFull) as e:
+                raise overloaded_error(e)
+            source = "model"
+            timer.mark("inference")
+            if predicted_cost is not None:
+                cache.put(obs, handle.version, predicted_cost)
+            
+    if predicted_cost is None:
+        source = "heuristic"
+        predicted_cost = float(heuristic_costs(obs[None, :])[0])
+        fallback_total.inc("/predict", fallback_reason)
+        timer.mark("fallback")
+    predictions_total.inc("/predict", source)
     
-    days_map = {
-        "lundi": 0, "mardi": 1, "mercredi": 2, "jeudi": 3, 
-        "vendredi": 4, "samedi": 5, "dimanche": 6
+    http_request.state.log_fields = {
+        "event": "predict",
+        "model_version": handle.version if handle is not None else None,
+        "source": source,
+        "fallback_reason": fallback_reason if source == "heuristic" else None,
+        "observation": obs.tolist(),
+        "cost": predicted_cost,
     }
-    day_idx = days_map.get(request.jour_semaine.lower(), 0)
-    
-    traffic = 0 # Low
-    is_weekend = (day_idx >= 5)
-    
-    if not is_weekend:
-        # Rush hours: 7-9 and 16-19
-        if (7 <= hour_int <= 9) or (16 <= hour_int <= 19):
-            traffic = 2 # High
-        elif (6 <= hour_int <= 20):
-            traffic = 1 # Medium
-        else:
-            traffic = 0 # Low
+    # Same fields as PredictionResponse
+    return json_response({
+        "prix_estime_fcfa": predicted_cost,
+        "prix_estime_range": format_range(predicted_cost),
+        "message": "Succès",
+        "fallback": source == "heuristic",
+        "fallback_reason": fallback_reason if source == "heuristic" else None,
+    })
+
+async def quote_observations(obs: np.ndarray, handle: Optional[ModelHandle], deadline: float, endpoint: str, timer=None):
+    """
+    Price an (N, 8) observation matrix: quote table, then cache, then a single
+    policy call (under the deadline and the circuit breaker) for the remaining
+    rows. Rows the model could not price get the heuristic.
+
+    Returns (costs, from_model, reason, sources): from_model is False on the
+    heuristic rows, reason is their fallback reason (None if there are none) and
+    sources counts the rows per source. The counters are updated here.
+    InferenceOverloaded is left to the caller.
+    """
+    costs = np.zeros(len(obs))
+    covered = np.zeros(len(obs), dtype=bool)
+    sources = {}
+    reason = "model_loading"
+    if handle is not None:
+        if handle.quote_table is not None:
+            costs, covered = handle.quote_table.lookup(obs)
+        sources["quote_table"] = int(covered.sum())
+        for i in np.flatnonzero(~covered):
+            cached = cache.get(obs[i], handle.version)
+            if cached is not None:
+                costs[i], covered[i] = cached, True
+        sources["cache"] = int(covered.sum()) - sources["quote_table"]
+        if timer is not None:
+            timer.mark("lookup")
+        if not covered.all():
+            missing = np.flatnonzero(~covered)
+            model_costs, reason = await infer_within_budget(
+                lambda: executor.run(obs[missing], handle.policy), deadline, endpoint
+            )
+            if timer is not None:
+                timer.mark("inference")
+            if model_costs is not None:
+                costs[missing] = model_costs
+                covered[missing] = True
+                sources["model"] = len(missing)
+                for i in missing:
+                    cache.put(obs[i], handle.version, float(costs[i]))
+    # Only the rows the model could not price fall back to the heuristic
+    if covered.all():
+        reason = None
     else:
-        # Weekend
-        if (10 <= hour_int <= 18):
-            traffic = 1 # Medium
-        else:
-            traffic = 0 # Low
-            
-    # Construct Observation
-    obs = np.array([distance, road_type, traffic, rain, is_night, accident, has_luggage, is_wide_road], dtype=np.float32)
-    print(f"DEBUG: Prediction Observation: {obs.tolist()}")
+        missing = np.flatnonzero(~covered)
+        costs[missing] = heuristic_costs(obs[missing])
+        sources["heuristic"] = len(missing)
+        fallback_total.inc(endpoint, reason, amount=len(missing))
+        if timer is not None:
+            timer.mark("fallback")
+    for source, count in sources.items():
+        if count:
+            predictions_total.inc(endpoint, source, amount=count)
+    return costs, covered, reason, sources
+
+# Items of /predict/batch and /predict/stream, as BatchPredictionItem dicts
+def quote_item(index: int, cost: float, fallback_reason: Optional[str]) -> dict:
+    return {
+        "index": index,
+        "prix_estime_fcfa": cost,
+        "prix_estime_range": format_range(cost),
+        "message": "Succès",
+        "error": None,
+        "fallback": fallback_reason is not None,
+        "fallback_reason": fallback_reason,
+    }
+
+def error_item(index: int, error: str) -> dict:
+    return {
+        "index": index,
+        "prix_estime_fcfa": None,
+        "prix_estime_range": None,
+        "message": "Erreur",
+        "error": error,
+        "fallback": False,
+        "fallback_reason": None,
+    }
+
+def describe_validation_error(e: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(l) for l in err['loc'])}: {err['msg']}" for err in e.errors())
+
+@app.post(
+    "/predict/batch",
+    response_model=BatchPredictionResponse,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": {
+                "type": "array",
+                "items": PREDICTION_REQUEST_SCHEMA,
+            }}},
+        }
+    },
+    responses={422: {"description": "Validation Error"}},
+)
+async def predict_batch(http_request: Request):
+    """
+    Quote many trips at once. Items are validated one by one so a bad item only
+    fails itself; all valid items go through the policy in a single (N, 8) forward pass.
+    """
+    timer = http_request.state.timer
+    payloads = await read_json_body(http_request)
+    if not isinstance(payloads, list):
+        raise RequestValidationError([{"type": "list_type", "loc": ("body",), "msg": "Input should be a valid list", "input": payloads}])
+    timer.mark("parse")
+    if len(payloads) > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch too large: {len(payloads)} items (max {MAX_BATCH_ITEMS})")
     
-    # Predict
-    if model:
+    results: List[Optional[dict]] = [None] * len(payloads)
+    valid_indices = []
+    rows = []
+    for i, payload in enumerate(payloads):
+        if not isinstance(payload, dict):
+            results[i] = error_item(i, "item must be a JSON object")
+            continue
         try:
-            action, _ = model.predict(obs, deterministic=True)
-            print(f"DEBUG: Model Action: {action}")
-            predicted_cost = float(action[0])
-        except Exception as e:
-            print(f"DEBUG: Inference failed: {e}")
-            model = None # Trigger fallback on next line
-            
-    if not model:
-        # HEURISTIC FALLBACK (based on simulation logic)
-        print("DEBUG: Using Heuristic Fallback")
-        base_rate = 150 # CFA per km
-        cost = distance * base_rate
-        if road_type == 1: cost *= 1.2
-        if road_type == 2: cost *= 1.5
-        if traffic == 1: cost *= 1.3
-        if traffic == 2: cost *= 1.7
-        if is_night: cost *= 1.2
-        if has_luggage: cost += 500
-        if is_wide_road: cost *= 0.9
-        predicted_cost = max(500, cost) # Minimum fare 500
+            rows.append(parse_prediction_request(payload))
+            valid_indices.append(i)
+        except ValidationError as e:
+            results[i] = error_item(i, describe_validation_error(e))
+    timer.mark("parse")
     
-    print(f"DEBUG: Final Predicted Cost: {predicted_cost}")
-    
-    # Range
-    cost_min = int(predicted_cost * 0.9)
-    cost_max = int(predicted_cost * 1.1)
+    sources = {}
+    fallback_reasons = {}
+    if rows:
+        # All valid items are encoded in one pass (see features.py)
+        obs = encode_requests(rows)
+        timer.mark("encode")
+        try:
+            costs, from_model, reason, sources = await quote_observations(
+                obs, http_request.state.model_handle, request_deadline(http_request), "/predict/batch", timer
+            )
+        except InferenceOverloaded as e:
+            raise overloaded_error(e)
+        if reason is not None:
+            fallback_reasons[reason] = sources["heuristic"]
+        for i, cost, item_from_model in zip(valid_indices, costs.tolist(), from_model.tolist()):
+            results[i] = quote_item(i, cost, None if item_from_model else reason)
     
-    return PredictionResponse(
-        prix_estime_fcfa=predicted_cost,
-        prix_estime_range=f"{cost_min} - {cost_max} FCFA",
-        message="Succès"
+    errors = len(payloads) - len(rows)
+    handle = http_request.state.model_handle
+    http_request.state.log_fields = {
+        "event": "predict_batch",
+        "model_version": handle.version if handle is not None else None,
+        "sources": sources,
+        "fallback_reasons": fallback_reasons,
+        "count": len(payloads),
+        "errors": errors,
+    }
+    # Same fields as BatchPredictionResponse
+    return json_response({"results": results, "count": len(payloads), "errors": errors})
+
+class StreamLineTooLong(ValueError):
+    pass
+
+class UploadStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse whose body iterator reads the request body while it writes.
+
+    Under ASGI < 2.4 (uvicorn) StreamingResponse watches for the client's
+    disconnect with receive(), which would swallow the upload. Here a disconnect
+    surfaces as ClientDisconnect in the iterator's own request.stream().
+    """
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+async def ndjson_lines(http_request: Request):
+    """Lines of the request body, yielded as the client uploads it."""
+    pending = b""
+    async for data in http_request.stream():
+        pending += data
+        if b"\n" not in data:
+            if len(pending) > MAX_STREAM_LINE_BYTES:
+                raise StreamLineTooLong(f"record longer than {MAX_STREAM_LINE_BYTES} bytes")
+            continue
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line
+    if pending:
+        yield pending
+
+async def quote_stream_chunk(items: list, first_index: int, handle: Optional[ModelHandle], budget: float) -> bytes:
+    """NDJSON results of a chunk of validated requests (or error item dicts, passed through)."""
+    positions = [k for k, item in enumerate(items) if not isinstance(item, dict)]
+    if positions:
+        obs = encode_requests([items[k] for k in positions])
+        while True:
+            try:
+                costs, from_model, reason, _ = await quote_observations(
+                    obs, handle, time.perf_counter() + budget, "/predict/stream"
+                )
+                break
+            except InferenceOverloaded:
+                # A stream cannot answer 503 halfway: wait instead, which also
+                # stops reading the upload until inference catches up
+                shed_total.inc()
+                await asyncio.sleep(RETRY_AFTER_SECONDS)
+        for k, cost, item_from_model in zip(positions, costs.tolist(), from_model.tolist()):
+            items[k] = quote_item(first_index + k, cost, None if item_from_model else reason)
+    return b"".join(codec.dumps(item) + b"\n" for item in items)
+
+async def quote_stream(http_request: Request, handle: Optional[ModelHandle], budget: float):
+    started = time.perf_counter()
+    count = errors = 0
+    chunk = []
+    try:
+        async for line in ndjson_lines(http_request):
+            if not line.strip():
+                continue
+            try:
+                payload = codec.loads(line)
+                if not isinstance(payload, dict):
+                    raise ValueError("item must be a JSON object")
+                chunk.append(parse_prediction_request(payload))
+            except ValidationError as e:
+                chunk.append(error_item(count, describe_validation_error(e)))
+                errors += 1
+            except ValueError as e: # invalid JSON (codec.JSONDecodeError) or not an object
+                chunk.append(error_item(count, f"invalid record: {e}"))
+                errors += 1
+            count += 1
+            if len(chunk) >= STREAM_CHUNK_SIZE:
+                yield await quote_stream_chunk(chunk, count - len(chunk), handle, budget)
+                chunk = []
+        if chunk:
+            yield await quote_stream_chunk(chunk, count - len(chunk), handle, budget)
+    except StreamLineTooLong as e:
+        yield codec.dumps(error_item(count, str(e))) + b"\n"
+        errors += 1
+    except ClientDisconnect:
+        logger.warning("Client disconnected from /predict/stream after %d records", count)
+        return
+    logger.info("predict_stream", extra={
+        "event": "predict_stream",
+        "model_version": handle.version if handle is not None else None,
+        "count": count,
+        "errors": errors,
+        "seconds": round(time.perf_counter() - started, 3),
+    })
+
+@app.post(
+    "/predict/stream",
+    response_class=UploadStreamingResponse,
+    responses={200: {"content": {"application/x-ndjson": {}}, "description": "One BatchPredictionItem per line, in input order"}},
+)
+async def predict_stream(http_request: Request):
+    """
+    Bulk quotes as NDJSON: one PredictionRequest JSON object per line in the
+    body, one BatchPredictionItem per line in the response (`index` is the
+    record's position, blank lines are skipped).
+
+    Records are read, scored and written STREAM_CHUNK_SIZE at a time while the
+    upload is still in progress, so memory stays constant whatever the size of
+    the upload. The next chunk is only read once the previous results have been
+    sent, so a slow reader also slows down the upload. Every chunk is priced by
+    the model version pinned at the start of the stream.
+    """
+    budget = request_budget(http_request)
+    return UploadStreamingResponse(
+        quote_stream(http_request, http_request.state.model_handle, budget),
+        media_type="application/x-ndjson",
     )
 
+class ReloadRequest(BaseModel):
+    model_path: Optional[str] = None # default: latest checkpoint
+
+@app.post("/admin/reload", include_in_schema=False)
+async def admin_reload(body: Optional[ReloadRequest] = None, x_admin_token: Optional[str] = Header(None)):
+    """
+    Load a checkpoint into a separate handle, warm it up and atomically swap it in.
+    The previous model keeps serving if the new one fails to load.
+    """
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+    
+    model_path = resolve_admin_model_path(body.model_path) if body and body.model_path else None
+    previous = supervisor.current
+    ok, error = await asyncio.to_thread(supervisor.reload, model_path)
+    if not ok:
+        raise HTTPException(status_code=500, detail={
+            "error": error,
+            "model_version": previous.version if previous else None,
+        })
+    return {
+        "status": "reloaded",
+        "model_version": supervisor.current.version,
+        "previous_version": previous.version if previous else None,
+    }
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """All metrics in the Prometheus text exposition format."""
+    return PlainTextResponse(registry.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/metrics/batching")
+async def batching_metrics():
+    """Batch-size distribution and queueing delay of the /predict micro-batcher."""
+    return {**batcher.stats(), "executor": executor.stats(), "single_flight": single_flight.stats()}
+
+@app.get("/metrics/quote_table")
+async def quote_table_metrics():
+    """Size and measured interpolation error of the precomputed quote table."""
+    handle = supervisor.current
+    if handle is None or handle.quote_table is None:
+        return {"enabled": False}
+    return handle.quote_table.stats()
+
+@app.get("/metrics/model")
+async def model_metrics():
+    """Model supervisor state: version served, load attempts and last error."""
+    return supervisor.stats()
+
+@app.get("/metrics/logging")
+async def logging_metrics():
+    """Log level, sampling rate and queue usage of the structured log pipeline."""
+    return log_pipeline.stats()
+
+@app.get("/metrics/breaker")
+async def breaker_metrics():
+    """State of the inference circuit breaker and its recent failure/slow-call rates."""
+    return breaker.stats()
+
+@app.get("/metrics/od_matrix")
+async def od_matrix_metrics():
+    """Places and lookup counters of the O/D distance matrix (enabled: false without one)."""
+    if od_matrix is None:
+        return {"enabled": False}
+    return {"enabled": True, **od_matrix.stats()}
+
+@app.get("/metrics/cache")
+async def cache_metrics():
+    """Hit/miss/eviction counters of the prediction cache."""
+    return cache.stats()
+
+# Endpoints reported by name in the request metrics, anything else is "other"
+INSTRUMENTED_PATHS = frozenset(route.path for route in app.routes)
+
 if __name__ == "__main__":
     try:
         # Port is often provided by the environment in production (e.g., Render/Heroku)
         port = int(os.environ.get("PORT", 8000))
         print(f"Starting Uvicorn server on http://0.0.0.0:{port}")
-        uvicorn.run(app, host="0.0.0.0", port=port, log_level="info")
+        # Access logs are synchronous and unsampled: the structured per-request records replace them
+        uvicorn.run(app, host="0.0.0.0", port=port, log_level="info", access_log=False)
     except Exception as e:
         print(f"Server failed to start: {e}")
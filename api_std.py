@@ -1,111 +1,358 @@
+"""
+Zero-dependency fallback server (standard library + numpy), for hosts where
+FastAPI/uvicorn are not available.
+
+- HTTP/1.1 keep-alive: a client reuses its connection for many requests.
+- Bounded worker pool: each connection is served by one of STD_WORKERS threads;
+  up to STD_MAX_PENDING more connections wait for a thread, beyond that new
+  connections get an immediate 503. Idle keep-alive connections give their
+  thread back after KEEPALIVE_TIMEOUT_SECONDS.
+- Request bodies above MAX_REQUEST_BYTES are refused with 413.
+- SIGTERM/SIGINT stop accepting connections and let in-flight requests finish.
+
+Endpoints: POST /predict, POST /predict/batch, GET /healthz, /readyz, /metrics.
+"""
 import http.server
 import json
-import numpy as np
+import logging
+import math
 import os
-from stable_baselines3 import PPO
-from env import TravelCostEnv
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from numpy_policy import load_policy
+from checkpoints import latest_checkpoint
+from features import encode_payloads
+from distance_matrix import DistanceMatrix
+from structured_log import StageTimer
+import metrics
 
 # Configuration
-PORT = 8000
+PORT = int(os.environ.get("PORT", 8000))
 MODEL_DIR = "models/PPO"
-
-def get_latest_model():
-    if not os.path.exists(MODEL_DIR):
-        return None
-    models = [f for f in os.listdir(MODEL_DIR) if f.endswith('.zip')]
-    if not models:
-        return None
-    models.sort(key=lambda x: int(x.replace('.zip', '')))
-    return os.path.join(MODEL_DIR, models[-1])
+STD_WORKERS = int(os.environ.get("STD_WORKERS", 16))
+STD_MAX_PENDING = int(os.environ.get("STD_MAX_PENDING", 64))
+KEEPALIVE_TIMEOUT_SECONDS = float(os.environ.get("KEEPALIVE_TIMEOUT_SECONDS", 5))
+MAX_REQUEST_BYTES = int(os.environ.get("MAX_REQUEST_BYTES", 1 << 20))
+MAX_BATCH_ITEMS = int(os.environ.get("MAX_BATCH_ITEMS", 1000))
+RETRY_AFTER_SECONDS = int(os.environ.get("RETRY_AFTER_SECONDS", 1))
 
 # Global model
 model = None
-model_path = get_latest_model()
+model_path = latest_checkpoint(MODEL_DIR)
 if model_path:
     print(f"Loading model from {model_path}...")
-    env = TravelCostEnv()
-    model = PPO.load(model_path, env=env)
-    print("✅ Model loaded successfully!")
+    # NumPy policy when exported (python numpy_policy.py), PPO.load otherwise
+    model = load_policy(model_path)
+    print(f"✅ Model loaded successfully! ({type(model).__name__})")
 else:
     print("❌ No model found! API will return 503.")
 
+# Origin/destination mode, same as api.py: payloads without distance_km take
+# the route of depart_osm -> destination_osm from the memory-mapped matrix
+od_matrix = DistanceMatrix.open_if_present(os.environ.get("OD_MATRIX_DIR", "od_matrix"))
+if od_matrix is not None:
+    print(f"✅ O/D distance matrix loaded ({len(od_matrix.index)} places)")
+
+# Prometheus metrics served on GET /metrics (see metrics.py)
+registry = metrics.Registry()
+requests_total = registry.counter("api_requests_total", "HTTP requests by endpoint and status code.", ("endpoint", "status"))
+request_duration = registry.histogram("api_request_duration_seconds", "End-to-end request latency.", ("endpoint",))
+stage_duration = registry.histogram(
+    "api_stage_duration_seconds",
+    "Request latency by stage: parse (body read and JSON decoding), encode, inference, serialize.",
+    ("endpoint", "stage"),
+)
+predictions_total = registry.counter("api_predictions_total", "Quotes served by source.", ("endpoint", "source"))
+registry.gauge(
+    "api_model_info", "Model version being served (value 1).", ("version",),
+    fn=lambda: {(os.path.basename(model_path) if model else "none",): 1},
+)
+registry.gauge("api_model_ready", "1 once a model is loaded.", fn=lambda: int(model is not None))
+registry.stats(
+    "api_od_matrix", "O/D distance matrix", lambda: od_matrix.stats() if od_matrix is not None else {}, counters=("lookups", "misses")
+)
+metrics.register_process_metrics(registry)
+
+INSTRUMENTED_PATHS = frozenset(["/predict", "/predict/batch", "/healthz", "/readyz", "/metrics"])
+
+logger = logging.getLogger(__name__)
+
+def finite_float(text):
+    """json parse_float: 1e999 would decode to inf, which no quote can be computed from."""
+    value = float(text)
+    if not math.isfinite(value):
+        raise ValueError(f"number out of range: {text}")
+    return value
+
+def reject_constant(name):
+    """json parse_constant: NaN, Infinity and -Infinity are not valid JSON numbers."""
+    raise ValueError(f"invalid number: {name}")
+
+class RequestError(Exception):
+    """Answered as {"detail": ...} with the given status; close=True when the body was not read."""
+
+    def __init__(self, status, detail, close=False):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+        self.close = close
+
+def format_range(predicted_cost):
+    cost_min = int(predicted_cost * 0.9)
+    cost_max = int(predicted_cost * 1.1)
+    return f"{cost_min} - {cost_max} FCFA"
+
+def complete_route(payload):
+    """Route fields from the O/D matrix for payloads sending depart_osm/destination_osm instead of distance_km."""
+    if od_matrix is None or not isinstance(payload, dict):
+        return payload
+    return od_matrix.complete_payload(payload)
+
+def predict_costs(obs):
+    actions, _ = model.predict(obs, deterministic=True)
+    return actions.reshape(len(obs), -1)[:, 0].astype(float).tolist()
+
 class SimplePredictHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes: without TCP_NODELAY, Nagle's algorithm
+    # and delayed ACKs add ~40ms to every keep-alive response
+    disable_nagle_algorithm = True
+    # Socket timeout: an idle keep-alive connection releases its worker thread
+    timeout = KEEPALIVE_TIMEOUT_SECONDS
+
+    def send_response(self, code, message=None):
+        self.status_code = code
+        super().send_response(code, message)
+
+    def log_request(self, code='-', size='-'):
+        # No synchronous per-request access log, see /metrics
+        pass
+
+    def record_request(self, timer):
+        endpoint = self.path if self.path in INSTRUMENTED_PATHS else "other"
+        for stage, seconds in timer.stages.items():
+            stage_duration.observe(seconds, endpoint, stage)
+        requests_total.inc(endpoint, str(getattr(self, "status_code", 0)))
+        request_duration.observe(time.perf_counter() - timer.started, endpoint)
+
+    def send_body(self, status, body, content_type='application/json', headers=None, close=False):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if close or self.server.stopping:
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, status, payload, headers=None, close=False):
+        self.send_body(status, json.dumps(payload).encode('utf-8'), headers=headers, close=close)
+
+    def read_json(self):
+        if 'chunked' in self.headers.get('Transfer-Encoding', '').lower():
+            raise RequestError(411, "Chunked bodies are not supported, send Content-Length", close=True)
+        length = self.headers.get('Content-Length')
+        if length is None:
+            raise RequestError(411, "Content-Length required", close=True)
+        try:
+            length = int(length)
+        except ValueError:
+            raise RequestError(400, "Invalid Content-Length", close=True)
+        if length < 0:
+            raise RequestError(400, "Invalid Content-Length", close=True)
+        if length > MAX_REQUEST_BYTES:
+            raise RequestError(413, f"Request body too large: {length} bytes (max {MAX_REQUEST_BYTES})", close=True)
+        post_data = self.rfile.read(length)
+        try:
+            return json.loads(post_data.decode('utf-8'), parse_float=finite_float, parse_constant=reject_constant)
+        except ValueError as e:
+            raise RequestError(400, f"Error: {str(e)}")
+
+    def do_GET(self):
+        timer = StageTimer()
+        try:
+            if self.path == '/metrics':
+                self.send_body(200, registry.render().encode('utf-8'), content_type=metrics.CONTENT_TYPE)
+            elif self.path == '/healthz':
+                self.send_json(200, {"status": "ok"})
+            elif self.path == '/readyz':
+                if model is not None:
+                    self.send_json(200, {"status": "ready", "model_version": os.path.basename(model_path)})
+                else:
+                    self.send_json(503, {"status": "no_model"})
+            else:
+                self.send_json(404, {"detail": "Not Found"})
+        finally:
+            self.record_request(timer)
+
     def do_POST(self):
-        if self.path == '/predict':
-            content_length = int(self.headers['Content-Length'])
-            post_data = self.rfile.read(content_length)
-            
+        timer = StageTimer()
+        self.status_code = 0
+        try:
+            if self.path == '/predict':
+                self.predict(timer)
+            elif self.path == '/predict/batch':
+                self.predict_batch(timer)
+            else:
+                raise RequestError(404, "Not Found", close=True)
+        except RequestError as e:
+            self.send_json(e.status, {"detail": e.detail}, close=e.close)
+        except Exception:
+            logger.exception("Unhandled error on POST %s", self.path)
+            if self.status_code:
+                # The response was already started: the connection can't be reused
+                self.close_connection = True
+            else:
+                self.send_json(500, {"detail": "Internal Server Error"})
+        finally:
+            self.record_request(timer)
+
+    def predict(self, timer):
+        request = self.read_json()
+        timer.mark("parse")
+        if not model:
+            raise RequestError(503, "Model not loaded")
+
+        try:
+            # Same encoding as api.py (see features.py); missing fields take default values
+            obs = encode_payloads([complete_route(request)])
+        except (AttributeError, TypeError, ValueError) as e:
+            raise RequestError(400, f"Error: {str(e)}")
+        timer.mark("encode")
+
+        predicted_cost = predict_costs(obs)[0]
+        timer.mark("inference")
+        predictions_total.inc("/predict", "model")
+
+        response = {
+            "prix_estime_fcfa": predicted_cost,
+            "prix_estime_range": format_range(predicted_cost),
+            "message": "Succès (Standard API)"
+        }
+        self.send_json(200, response)
+        timer.mark("serialize")
+
+    def predict_batch(self, timer):
+        """Same request and response shape as api.py's /predict/batch: a bad item only fails itself."""
+        payloads = self.read_json()
+        timer.mark("parse")
+        if not isinstance(payloads, list):
+            raise RequestError(400, "Body must be a JSON list of payloads")
+        if len(payloads) > MAX_BATCH_ITEMS:
+            raise RequestError(413, f"Batch too large: {len(payloads)} items (max {MAX_BATCH_ITEMS})")
+        if not model:
+            raise RequestError(503, "Model not loaded")
+
+        results = [None] * len(payloads)
+        valid = []
+        obs = None
+        if all(isinstance(payload, dict) for payload in payloads):
             try:
-                request = json.loads(post_data.decode('utf-8'))
-                
-                # Input Mapping (Sync with api.py logic)
-                distance = float(request.get('distance_km', 0))
-                
-                road_map = {"bonne": 0, "moyenne": 1, "mauvaise": 2}
-                road_type = road_map.get(request.get('etat_route', 'bonne').lower(), 1)
-                
-                try:
-                    rain = float(request.get('pluie', 0))
-                except:
-                    rain = 0.0
-                
-                accident = 1 if str(request.get('accident', '0')) == "1" else 0
-                has_luggage = 1 if str(request.get('bagages', 'non')).lower() == "oui" else 0
-                is_wide_road = 1 if str(request.get('routes_larges', 'non')).lower() == "oui" else 0
-                
-                try:
-                    hour_str = request.get('heure', '12:00')
-                    hour_int = int(hour_str.split(":")[0])
-                except:
-                    hour_int = 12
-                
-                is_night = 1 if (hour_int >= 19 or hour_int < 6) else 0
-                
-                # Traffic Heuristic
-                days_map = {
-                    "lundi": 0, "mardi": 1, "mercredi": 2, "jeudi": 3, 
-                    "vendredi": 4, "samedi": 5, "dimanche": 6
-                }
-                day_idx = days_map.get(request.get('jour_semaine', 'lundi').lower(), 0)
-                
-                traffic = 0
-                is_weekend = (day_idx >= 5)
-                if not is_weekend:
-                    if (7 <= hour_int <= 9) or (16 <= hour_int <= 19): traffic = 2
-                    elif (6 <= hour_int <= 20): traffic = 1
+                obs = encode_payloads([complete_route(payload) for payload in payloads])
+                valid = list(range(len(payloads)))
+            except (AttributeError, TypeError, ValueError):
+                pass
+        if obs is None:
+            # Some items are invalid: find them one by one
+            for i, payload in enumerate(payloads):
+                error = None
+                if not isinstance(payload, dict):
+                    error = "item must be a JSON object"
                 else:
-                    if (10 <= hour_int <= 18): traffic = 1
-
-                # Observation
-                obs = np.array([distance, road_type, traffic, rain, is_night, accident, has_luggage, is_wide_road], dtype=np.float32)
-                
-                if model:
-                    action, _ = model.predict(obs, deterministic=True)
-                    predicted_cost = float(action[0])
-                    
-                    cost_min = int(predicted_cost * 0.9)
-                    cost_max = int(predicted_cost * 1.1)
-                    
-                    response = {
-                        "prix_estime_fcfa": predicted_cost,
-                        "prix_estime_range": f"{cost_min} - {cost_max} FCFA",
-                        "message": "Succès (Standard API)"
-                    }
-                    
-                    self.send_response(200)
-                    self.send_header('Content-Type', 'application/json')
-                    self.end_headers()
-                    self.wfile.write(json.dumps(response).encode('utf-8'))
+                    try:
+                        payloads[i] = complete_route(payload)
+                        encode_payloads([payloads[i]])
+                    except (AttributeError, TypeError, ValueError) as e:
+                        error = str(e)
+                if error is None:
+                    valid.append(i)
                 else:
-                    self.send_error(503, "Model not loaded")
-                    
-            except Exception as e:
-                self.send_error(400, f"Error: {str(e)}")
-        else:
-            self.send_error(404)
+                    results[i] = {"index": i, "prix_estime_fcfa": None, "prix_estime_range": None, "message": "Erreur", "error": error}
+            obs = encode_payloads([payloads[i] for i in valid])
+        timer.mark("encode")
+
+        if valid:
+            costs = predict_costs(obs)
+            timer.mark("inference")
+            predictions_total.inc("/predict/batch", "model", amount=len(valid))
+            for i, cost in zip(valid, costs):
+                results[i] = {"index": i, "prix_estime_fcfa": cost, "prix_estime_range": format_range(cost), "message": "Succès", "error": None}
+
+        self.send_json(200, {"results": results, "count": len(payloads), "errors": len(payloads) - len(valid)})
+        timer.mark("serialize")
+
+class PooledHTTPServer(http.server.HTTPServer):
+    """
+    HTTPServer whose connections are served by a bounded thread pool. A
+    connection that finds every worker busy and the waiting list full is
+    answered 503 right away instead of queueing without limit.
+    """
+    allow_reuse_address = True
+    request_queue_size = 1024
+
+    def __init__(self, server_address, handler_class, workers=16, max_pending=64):
+        super().__init__(server_address, handler_class)
+        self.workers = max(1, int(workers))
+        self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="api-std")
+        self.slots = threading.BoundedSemaphore(self.workers + max(0, int(max_pending)))
+        self.stopping = False
+        self.active = 0
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+    def process_request(self, request, client_address):
+        if self.stopping or not self.slots.acquire(blocking=False):
+            self.rejected += 1
+            try:
+                request.sendall(
+                    b"HTTP/1.1 503 Service Unavailable\r\nRetry-After: " + str(RETRY_AFTER_SECONDS).encode()
+                    + b"\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+                )
+            except OSError:
+                pass
+            self.shutdown_request(request)
+            return
+        self.pool.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        with self.lock:
+            self.active += 1
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            with self.lock:
+                self.active -= 1
+            self.slots.release()
+
+    def stop(self):
+        """Stop accepting connections; open ones close after their current request."""
+        self.stopping = True
+        threading.Thread(target=self.shutdown, daemon=True).start()
+
+    def server_close(self):
+        super().server_close()
+        # Waits for the in-flight requests
+        self.pool.shutdown(wait=True)
+
+def serve(port=PORT):
+    httpd = PooledHTTPServer(('', port), SimplePredictHandler, workers=STD_WORKERS, max_pending=STD_MAX_PENDING)
+    registry.gauge("api_std_active_connections", "Connections being served by a worker thread.", fn=lambda: httpd.active)
+    registry.counter("api_std_rejected_connections_total", "Connections refused with 503 because the pool was full.", fn=lambda: httpd.rejected)
+    signal.signal(signal.SIGTERM, lambda signum, frame: httpd.stop())
+    signal.signal(signal.SIGINT, lambda signum, frame: httpd.stop())
+    print(f"🚀 Server running on port {port} ({STD_WORKERS} workers, keep-alive {KEEPALIVE_TIMEOUT_SECONDS:g}s)...")
+    try:
+        httpd.serve_forever()
+    finally:
+        httpd.server_close()
+    print("👋 Server stopped")
 
 if __name__ == "__main__":
-    server_address = ('', PORT)
-    httpd = http.server.HTTPServer(server_address, SimplePredictHandler)
-    print(f"🚀 Server running on port {PORT}...")
-    httpd.serve_forever()
+    serve()
@@ -0,0 +1,183 @@
+"""
+Dynamic micro-batching for the prediction API.
+
+Concurrent /predict calls each carry a single observation. Instead of running
+one policy forward pass per request, the MicroBatcher queues them, waits a
+couple of milliseconds (or until the batch is full) and scores the whole group
+with one call to the batched predict function. The predict function may be a
+coroutine (e.g. InferenceExecutor.run), in which case several batches can be in
+flight at once.
+"""
+import asyncio
+import inspect
+import time
+import numpy as np
+
+# Upper bounds of the histogram buckets (batch sizes and queueing delays in ms)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+QUEUE_DELAY_BUCKETS_MS = (0.5, 1, 2, 5, 10, 25, 50, 100, 250)
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent single-observation requests into batched forward passes.
+
+    predict_fn receives an (N, 8) float32 matrix and must return N costs.
+    Requests submitted with a context (e.g. the model handle they were pinned to)
+    are only batched with requests sharing that context, which is passed on as
+    predict_fn(obs, context).
+    At most max_queue requests may wait for a batch; beyond that submit()
+    raises asyncio.QueueFull so the caller can shed load.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=64, max_wait_ms=2.0, max_queue=0):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.max_queue = max(0, int(max_queue))
+        self.queue = None
+        self.worker = None
+        self.inflight = set()
+
+        # Metrics
+        self.batches = 0
+        self.items = 0
+        self.failed_batches = 0
+        self.batch_size_counts = [0] * (len(BATCH_SIZE_BUCKETS) + 1)
+        self.queue_delay_counts = [0] * (len(QUEUE_DELAY_BUCKETS_MS) + 1)
+        self.queue_delay_sum_ms = 0.0
+        self.queue_delay_max_ms = 0.0
+
+    @property
+    def running(self):
+        return self.worker is not None and not self.worker.done()
+
+    def start(self):
+        """Start the batching loop on the running event loop."""
+        if self.running:
+            return
+        self.queue = asyncio.Queue(maxsize=self.max_queue)
+        self.worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the batching loop and fail any request still waiting in the queue."""
+        if self.worker is not None:
+            self.worker.cancel()
+            try:
+                await self.worker
+            except asyncio.CancelledError:
+                pass
+            self.worker = None
+        if self.inflight:
+            await asyncio.gather(*self.inflight, return_exceptions=True)
+        while self.queue is not None and not self.queue.empty():
+            _, future, _, _ = self.queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Micro-batcher stopped"))
+
+    async def submit(self, obs, context=None):
+        """Queue one observation and wait for its predicted cost."""
+        if not self.running:
+            raise RuntimeError("Micro-batcher is not running")
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((obs, future, time.perf_counter(), context))
+        return await future
+
+    async def _collect(self):
+        """Wait for a first request, then gather more until the batch is full or max_wait expires."""
+        batch = [await self.queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            # Callers that gave up (client disconnect, timeout) are dropped from the batch
+            batch = [item for item in batch if not item[1].done()]
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            for _, _, enqueued, _ in batch:
+                self._record_delay((started - enqueued) * 1000.0)
+
+            # One forward pass per context, in arrival order
+            groups = {}
+            for item in batch:
+                groups.setdefault(id(item[3]), []).append(item)
+            for group in groups.values():
+                self._record_batch(len(group))
+                if inspect.iscoroutinefunction(self.predict_fn):
+                    task = asyncio.get_running_loop().create_task(self._dispatch(group))
+                    self.inflight.add(task)
+                    task.add_done_callback(self.inflight.discard)
+                else:
+                    await self._dispatch(group)
+
+    async def _dispatch(self, batch):
+        context = batch[0][3]
+        try:
+            obs = np.stack([item[0] for item in batch]).astype(np.float32, copy=False)
+            costs = self.predict_fn(obs) if context is None else self.predict_fn(obs, context)
+            if asyncio.iscoroutine(costs):
+                costs = await costs
+        except Exception as e:
+            self.failed_batches += 1
+            for _, future, _, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future, _, _), cost in zip(batch, costs):
+            if not future.done():
+                future.set_result(float(cost))
+
+    def _record_batch(self, size):
+        self.batches += 1
+        self.items += size
+        self.batch_size_counts[_bucket_index(BATCH_SIZE_BUCKETS, size)] += 1
+
+    def _record_delay(self, delay_ms):
+        self.queue_delay_sum_ms += delay_ms
+        self.queue_delay_max_ms = max(self.queue_delay_max_ms, delay_ms)
+        self.queue_delay_counts[_bucket_index(QUEUE_DELAY_BUCKETS_MS, delay_ms)] += 1
+
+    def stats(self):
+        """Batch-size distribution and queueing delay, as a JSON-friendly dict."""
+        size_labels = [f"<={b}" for b in BATCH_SIZE_BUCKETS] + [f">{BATCH_SIZE_BUCKETS[-1]}"]
+        delay_labels = [f"<={b}ms" for b in QUEUE_DELAY_BUCKETS_MS] + [f">{QUEUE_DELAY_BUCKETS_MS[-1]}ms"]
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "batches": self.batches,
+            "items": self.items,
+            "failed_batches": self.failed_batches,
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+            "batch_size_histogram": dict(zip(size_labels, self.batch_size_counts)),
+            "queue_depth": self.queue.qsize() if self.queue is not None else 0,
+            "max_queue": self.max_queue,
+            "inflight_batches": len(self.inflight),
+            "queue_delay_mean_ms": self.queue_delay_sum_ms / self.items if self.items else 0.0,
+            "queue_delay_max_ms": self.queue_delay_max_ms,
+            "queue_delay_histogram": dict(zip(delay_labels, self.queue_delay_counts)),
+        }
+
+
+def _bucket_index(bounds, value):
+    for i, bound in enumerate(bounds):
+        if value <= bound:
+            return i
+    return len(bounds)
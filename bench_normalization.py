@@ -0,0 +1,93 @@
+"""
+PPO steps needed to reach a target MAE, with and without the normalisation
+layer (see normalization.py).
+
+Both runs train the same PPO configuration from scratch on TravelCostVecEnv
+(same seed, same number of envs, same n_steps/batch_size) and evaluate the
+deterministic policy every --eval-every steps on a fixed set of simulated trips.
+A run stops at the first evaluation under --target-mae or after --max-steps.
+
+Usage:
+    python bench_normalization.py --target-mae 15000 --max-steps 1000000 --output normalization.json
+"""
+from stable_baselines3 import PPO
+from benchmark import git_commit
+from normalization import Normalization, NormalizedPolicy
+from simulation import sample_trips
+from vec_env import make_training_env, ppo_batch_params
+import argparse
+import json
+import time
+import numpy as np
+
+
+def mean_absolute_error(policy, observations, costs):
+    actions, _ = policy.predict(observations, deterministic=True)
+    return float(np.abs(np.asarray(actions, dtype=np.float64).reshape(len(costs), -1)[:, 0] - costs).mean())
+
+
+def steps_to_target(normalize, observations, costs, target_mae, max_steps, eval_every, vec_envs, seed):
+    normalization = Normalization() if normalize else None
+    env = make_training_env(vec_envs, seed=seed, normalization=normalization)
+    model = PPO("MlpPolicy", env, seed=seed, verbose=0, **ppo_batch_params(env))
+    policy = NormalizedPolicy(model, normalization) if normalize else model
+
+    curve = []
+    started = time.process_time()
+    steps = 0
+    while steps < max_steps:
+        model.learn(total_timesteps=eval_every, reset_num_timesteps=False)
+        steps = model.num_timesteps
+        mae = mean_absolute_error(policy, observations, costs)
+        curve.append({"steps": steps, "mae": mae, "cpu_seconds": time.process_time() - started})
+        print(f"   {'normalized' if normalize else 'raw':<10} {steps:>9,} steps  MAE {mae:>9,.0f} CFA")
+        if mae <= target_mae:
+            break
+    reached = curve[-1]["mae"] <= target_mae
+    return {
+        "reached": reached,
+        "steps": curve[-1]["steps"] if reached else None,
+        "cpu_seconds": curve[-1]["cpu_seconds"] if reached else None,
+        "final_mae": curve[-1]["mae"],
+        "curve": curve,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PPO steps to a target MAE, with and without normalisation")
+    parser.add_argument("--target-mae", type=float, default=15000, help="Target mean absolute error in CFA (default: 15000)")
+    parser.add_argument("--max-steps", type=int, default=1_000_000, help="Step budget per run (default: 1000000)")
+    parser.add_argument("--eval-every", type=int, default=20480, help="Steps between evaluations (default: 20480)")
+    parser.add_argument("--vec-envs", type=int, default=256)
+    parser.add_argument("--trips", type=int, default=5000, help="Evaluation trips (default: 5000)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the report as JSON")
+    args = parser.parse_args()
+
+    observations, costs = sample_trips(args.trips, np.random.default_rng(args.seed + 1))
+    print(f"\n🎯 Target MAE {args.target_mae:,.0f} CFA (mean cost {costs.mean():,.0f} CFA, {args.trips} trips)")
+    report = {
+        "target_mae": args.target_mae,
+        "max_steps": args.max_steps,
+        "commit": git_commit(),
+    }
+    for name, normalize in (("raw", False), ("normalized", True)):
+        report[name] = steps_to_target(
+            normalize, observations, costs, args.target_mae, args.max_steps, args.eval_every, args.vec_envs, args.seed
+        )
+
+    print(f"\n⏱️  Steps to MAE <= {args.target_mae:,.0f} CFA")
+    for name in ("raw", "normalized"):
+        run = report[name]
+        if run["reached"]:
+            print(f"   {name:<10} {run['steps']:>9,} steps ({run['cpu_seconds']:.0f}s CPU)")
+        else:
+            print(f"   {name:<10} not reached in {args.max_steps:,} steps (MAE {run['final_mae']:,.0f} CFA)")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
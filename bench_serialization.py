@@ -0,0 +1,171 @@
+"""
+Micro-benchmark of the /predict request/response serialisation (see codec.py).
+
+Compares the CPU time per request of
+  - before: FastAPI's generic path, a PredictionRequest body parameter and a
+    PredictionResponse return value (json.loads, pydantic validation,
+    response_model validation, jsonable_encoder, json.dumps);
+  - after: api.py's fast path (codec.loads, precompiled rules, pre-serialised
+    response).
+
+It reports the serialisation steps alone, then full requests through two minimal
+FastAPI apps that only differ by the path (the handler encodes the observation
+and returns a fixed price, no model), driven directly over ASGI so that neither
+the server nor the network is measured. Finally it runs the real api.app /predict
+with the model loaded, for scale.
+
+Usage:
+    python bench_serialization.py --requests 20000 --output serialization.json
+"""
+from fastapi import FastAPI, Request
+from fastapi.encoders import jsonable_encoder
+from benchmark import git_commit, sample_payload
+from features import encode_request
+import argparse
+import asyncio
+import json
+import random
+import time
+import api
+import codec
+
+
+def build_reference_app():
+    """The /predict handler signature before the fast path."""
+    app = FastAPI()
+
+    @app.post("/predict", response_model=api.PredictionResponse)
+    async def predict(request: api.PredictionRequest):
+        encode_request(request)
+        return api.PredictionResponse(prix_estime_fcfa=1234.5, prix_estime_range=api.format_range(1234.5), message="Succès")
+
+    return app
+
+
+def build_fast_app():
+    app = FastAPI()
+
+    @app.post("/predict", response_model=api.PredictionResponse)
+    async def predict(http_request: Request):
+        request = api.parse_prediction_request(await api.read_json_body(http_request))
+        encode_request(request)
+        return api.json_response({
+            "prix_estime_fcfa": 1234.5,
+            "prix_estime_range": api.format_range(1234.5),
+            "message": "Succès",
+            "fallback": False,
+            "fallback_reason": None,
+        })
+
+    return app
+
+
+async def call(app, body, path="/predict"):
+    """One POST through the ASGI app; returns the status code."""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0", "spec_version": "2.3"}, "http_version": "1.1",
+        "method": "POST", "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+        "root_path": "", "client": ("127.0.0.1", 50000), "server": ("127.0.0.1", 8000),
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    }
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    status = []
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        await asyncio.Event().wait() # no disconnect during the request
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+
+    await app(scope, receive, send)
+    return status[0]
+
+
+def cpu_per_call(fn, items, warmup=500):
+    for item in items[:warmup]:
+        fn(item)
+    started = time.process_time()
+    for item in items:
+        fn(item)
+    return (time.process_time() - started) / len(items) * 1e6
+
+
+async def cpu_per_request(app, bodies, warmup=500):
+    for body in bodies[:warmup]:
+        assert await call(app, body) == 200
+    started = time.process_time()
+    for body in bodies:
+        await call(app, body)
+    return (time.process_time() - started) / len(bodies) * 1e6
+
+
+def step_timings(bodies):
+    """Serialisation steps alone, before vs after (us per request)."""
+    response = api.PredictionResponse(prix_estime_fcfa=1234.5, prix_estime_range="1111 - 1358 FCFA", message="Succès")
+    response_dict = response.model_dump()
+    payloads = [json.loads(body) for body in bodies]
+    return {
+        "decode": {
+            "before": cpu_per_call(json.loads, bodies),
+            "after": cpu_per_call(codec.loads, bodies),
+        },
+        "validate": {
+            "before": cpu_per_call(api.PredictionRequest.model_validate, payloads),
+            "after": cpu_per_call(api.parse_prediction_request, payloads),
+        },
+        "encode_response": {
+            "before": cpu_per_call(
+                lambda _: json.dumps(jsonable_encoder(api.PredictionResponse.model_validate(response)), ensure_ascii=False).encode(),
+                bodies,
+            ),
+            "after": cpu_per_call(lambda _: codec.dumps(response_dict), bodies),
+        },
+    }
+
+
+async def run(bodies):
+    report = {
+        "codec": codec.BACKEND,
+        "steps_us": step_timings(bodies),
+        "request_us": {
+            "before": await cpu_per_request(build_reference_app(), bodies),
+            "after": await cpu_per_request(build_fast_app(), bodies),
+        },
+    }
+    async with api.lifespan(api.app):
+        while api.supervisor.current is None and api.supervisor.state != "retrying":
+            await asyncio.sleep(0.05)
+        report["api_predict_us"] = await cpu_per_request(api.app, bodies)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU per request of the /predict serialisation, before vs after the fast path")
+    parser.add_argument("--requests", type=int, default=20000, help="Requests per measurement (default: 20000)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the report as JSON")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    bodies = [json.dumps(sample_payload(rng)).encode() for _ in range(args.requests)]
+    report = asyncio.run(run(bodies))
+    report["commit"] = git_commit()
+    report["requests"] = args.requests
+
+    print(f"\n⏱️  CPU per /predict request ({report['codec']} codec, {args.requests} requests)")
+    for step, values in report["steps_us"].items():
+        print(f"   {step:<16} {values['before']:8.2f} us -> {values['after']:8.2f} us")
+    before, after = report["request_us"]["before"], report["request_us"]["after"]
+    print(f"   {'full request':<16} {before:8.2f} us -> {after:8.2f} us  (-{(1 - after / before) * 100:.0f}%)")
+    print(f"   api.app /predict with the model: {report['api_predict_us']:.2f} us")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
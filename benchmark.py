@@ -0,0 +1,319 @@
+"""
+Load generator and latency benchmark for the prediction API (api.py or api_std.py).
+
+Opens `--concurrency` keep-alive HTTP/1.1 connections with asyncio (standard
+library only) and sends payloads sampled from realistic trip distributions.
+
+- Closed loop (default): every connection sends its next request as soon as
+  the previous answer arrives; measures the maximum throughput.
+- Open loop (`--rate R`): requests are scheduled at R per second whatever the
+  server does. A request that cannot be sent on time because all connections
+  are busy still counts from its scheduled time: this is the
+  coordinated-omission-corrected latency, the one users actually see.
+
+Usage:
+    python benchmark.py --server api --concurrency 32 --duration 20
+    python benchmark.py --url http://127.0.0.1:8000 --rate 500 --output bench.json
+    python benchmark.py --server api_std --endpoint /predict/batch --batch-size 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from collections import Counter
+from urllib.parse import urlsplit
+import numpy as np
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+DAYS = ["lundi", "mardi", "mercredi", "jeudi", "vendredi", "samedi", "dimanche"]
+DAY_WEIGHTS = [1.0, 1.0, 1.0, 1.0, 1.1, 0.8, 0.5]
+# More trips around the rush hours, few at night
+HOUR_WEIGHTS = [0.2, 0.1, 0.1, 0.1, 0.2, 0.6, 1.2, 2.5, 2.5, 1.6, 1.2, 1.2,
+                1.4, 1.3, 1.1, 1.2, 1.8, 2.4, 2.4, 1.8, 1.2, 0.9, 0.6, 0.4]
+
+
+def sample_payload(rng):
+    """One /predict payload as the frontend sends it."""
+    return {
+        # Mostly urban trips, long tail of intercity ones
+        "distance_km": round(min(max(rng.lognormvariate(2.1, 0.9), 0.5), 600.0), 2),
+        "etat_route": rng.choices(["bonne", "moyenne", "mauvaise"], [0.5, 0.3, 0.2])[0],
+        "heure": f"{rng.choices(range(24), HOUR_WEIGHTS)[0]:02d}:{rng.randrange(60):02d}",
+        "jour_semaine": rng.choices(DAYS, DAY_WEIGHTS)[0],
+        "pluie": rng.choices(["0", "0.5", "1"], [0.6, 0.25, 0.15])[0],
+        "bagages": rng.choices(["oui", "non"], [0.3, 0.7])[0],
+        "routes_larges": rng.choices(["oui", "non"], [0.4, 0.6])[0],
+        "routes_travaux": rng.choices(["oui", "non"], [0.1, 0.9])[0],
+        "accident": rng.choices(["0", "1"], [0.95, 0.05])[0],
+    }
+
+
+def build_bodies(rng, count, batch_size):
+    """Pre-serialised request bodies, so JSON encoding is not part of the measurement."""
+    bodies = []
+    for _ in range(count):
+        if batch_size > 1:
+            payload = [sample_payload(rng) for _ in range(batch_size)]
+        else:
+            payload = sample_payload(rng)
+        bodies.append(json.dumps(payload).encode("utf-8"))
+    return bodies
+
+
+class Connection:
+    """Minimal keep-alive HTTP/1.1 client connection (Content-Length and chunked responses)."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def open(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        sock = self.writer.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+    async def post(self, path, body):
+        """Returns (status, headers). Reopens the connection if the server closed it."""
+        if self.writer is None:
+            await self.open()
+        self.writer.write(
+            f"POST {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode("latin-1") + body
+        )
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionResetError("connection closed by server")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                await self.reader.readexactly(size + 2)
+                if size == 0:
+                    break
+        else:
+            await self.reader.readexactly(int(headers.get("content-length", 0)))
+
+        if headers.get("connection", "").lower() == "close":
+            self.close()
+        return status, headers
+
+
+def summarize(latencies):
+    """Latency percentiles in milliseconds."""
+    if not latencies:
+        return None
+    values = np.asarray(latencies) * 1000
+    summary = {f"p{p:g}": round(float(np.percentile(values, p)), 3) for p in PERCENTILES}
+    summary["mean"] = round(float(values.mean()), 3)
+    summary["max"] = round(float(values.max()), 3)
+    return summary
+
+
+async def run_load(url, endpoint, bodies, concurrency, duration, warmup, rate, timeout):
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    deadline_warmup = time.perf_counter() + warmup
+    deadline = deadline_warmup + duration
+
+    service, corrected = [], []
+    statuses, errors, versions = Counter(), Counter(), Counter()
+    # Open loop: scheduled send times are handed to the connections through a queue
+    schedule = asyncio.Queue() if rate else None
+
+    async def scheduler():
+        interval = 1.0 / rate
+        next_at = time.perf_counter()
+        while next_at < deadline:
+            # Never block: a full set of busy connections must not delay the schedule
+            schedule.put_nowait(next_at)
+            next_at += interval
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        for _ in range(concurrency):
+            schedule.put_nowait(None)
+
+    async def worker(index):
+        conn = Connection(host, port)
+        i = index
+        try:
+            while True:
+                if schedule is not None:
+                    intended = await schedule.get()
+                    if intended is None:
+                        return
+                    wait = intended - time.perf_counter()
+                    if wait > 0:
+                        await asyncio.sleep(wait)
+                elif time.perf_counter() >= deadline:
+                    return
+                started = time.perf_counter()
+                if schedule is None:
+                    intended = started
+                body = bodies[i % len(bodies)]
+                i += concurrency
+                try:
+                    status, headers = await asyncio.wait_for(conn.post(endpoint, body), timeout)
+                    outcome = status
+                except (asyncio.TimeoutError, OSError, ValueError, asyncio.IncompleteReadError) as e:
+                    conn.close()
+                    status, headers, outcome = None, {}, type(e).__name__
+                finished = time.perf_counter()
+                if started < deadline_warmup:
+                    continue
+                if status is not None:
+                    statuses[status] += 1
+                    if "x-model-version" in headers:
+                        versions[headers["x-model-version"]] += 1
+                else:
+                    errors[outcome] += 1
+                if status == 200:
+                    service.append(finished - started)
+                    corrected.append(finished - intended)
+        finally:
+            conn.close()
+
+    tasks = [asyncio.create_task(worker(i)) for i in range(concurrency)]
+    if schedule is not None:
+        tasks.append(asyncio.create_task(scheduler()))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - deadline_warmup
+
+    total = sum(statuses.values()) + sum(errors.values())
+    ok = statuses.get(200, 0)
+    return {
+        "requests": total,
+        "ok": ok,
+        "error_rate": round((total - ok) / total, 6) if total else None,
+        "status_codes": {str(k): v for k, v in sorted(statuses.items())},
+        "transport_errors": dict(errors),
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_rps": round(ok / elapsed, 2) if elapsed > 0 else None,
+        "latency_ms": summarize(service),
+        # Same as latency_ms in closed loop, where there is no schedule to fall behind
+        "corrected_latency_ms": summarize(corrected) if rate else None,
+        "model_versions": dict(versions),
+    }
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(script, port, startup_timeout=120):
+    """Start api.py or api_std.py on port and wait until /readyz answers 200."""
+    env = dict(os.environ, PORT=str(port))
+    process = subprocess.Popen([sys.executable, f"{script}.py"], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + startup_timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{script}.py exited with code {process.returncode}")
+        try:
+            with urllib.request.urlopen(f"{url}/readyz", timeout=1) as r:
+                if r.status == 200:
+                    return process, url
+        except OSError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"{script}.py not ready after {startup_timeout}s")
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the travel cost prediction API")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="API base URL (ignored with --server)")
+    parser.add_argument("--server", choices=["api", "api_std"], help="Start this server locally on a free port for the run")
+    parser.add_argument("--endpoint", default="/predict", choices=["/predict", "/predict/batch"])
+    parser.add_argument("--batch-size", type=int, default=1, help="Payloads per request for /predict/batch")
+    parser.add_argument("--concurrency", type=int, default=16, help="Keep-alive connections")
+    parser.add_argument("--rate", type=float, default=0, help="Open-loop request rate per second (0: closed loop)")
+    parser.add_argument("--duration", type=float, default=10, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=2, help="Seconds sent before measuring")
+    parser.add_argument("--timeout", type=float, default=10, help="Per-request timeout in seconds")
+    parser.add_argument("--payloads", type=int, default=10000, help="Distinct payloads sampled")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    batch_size = args.batch_size if args.endpoint == "/predict/batch" else 1
+    bodies = build_bodies(random.Random(args.seed), args.payloads, batch_size)
+
+    process = None
+    url = args.url
+    if args.server:
+        print(f"🚀 Starting {args.server}.py...")
+        process, url = start_server(args.server, free_port())
+    try:
+        print(f"🧪 {args.endpoint} @ {url}: {args.concurrency} connections, "
+              f"{'rate ' + str(args.rate) + '/s' if args.rate else 'closed loop'}, {args.duration:g}s (+{args.warmup:g}s warm-up)")
+        results = asyncio.run(run_load(
+            url, args.endpoint, bodies, args.concurrency, args.duration, args.warmup, args.rate, args.timeout
+        ))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "config": {
+            "server": args.server, "url": url, "endpoint": args.endpoint, "batch_size": batch_size,
+            "concurrency": args.concurrency, "rate": args.rate, "duration": args.duration,
+            "warmup": args.warmup, "seed": args.seed,
+        },
+        "results": results,
+    }
+
+    latency = results["latency_ms"] or {}
+    print(f"📊 {results['ok']}/{results['requests']} OK ({results['error_rate'] or 0:.2%} errors), "
+          f"{results['throughput_rps']} req/s")
+    print("   latency  " + "  ".join(f"{k}={v}ms" for k, v in latency.items()))
+    if results["corrected_latency_ms"]:
+        print("   corrected " + "  ".join(f"{k}={v}ms" for k, v in results["corrected_latency_ms"].items()))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
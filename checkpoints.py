@@ -0,0 +1,61 @@
+"""
+Checkpoint selection shared by the APIs, predict.py, the trainers and
+online_learning.py. Standard library only: scanning models/PPO must not pull
+torch into the API or the online learner.
+
+Checkpoints are ranked by the training step count stable-baselines3 saves in
+them (num_timesteps), then by modification time: file names are not step
+counts (improved_50000.zip is fast_trainer.py's 50 000th step of a run that
+started from an earlier checkpoint). The number in the name is only used for
+archives without a readable step count.
+"""
+import json
+import os
+import re
+import zipfile
+
+MODELS_DIR = "models/PPO"
+
+_steps_cache = {} # (path, mtime_ns, size) -> num_timesteps
+
+
+def name_steps(filename):
+    """First number in a checkpoint name, 0 if there is none."""
+    nums = re.findall(r'\d+', filename)
+    return int(nums[0]) if nums else 0
+
+
+def checkpoint_steps(path):
+    """Training steps saved in a stable-baselines3 checkpoint (the name's number if unreadable)."""
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    steps = _steps_cache.get(key)
+    if steps is None:
+        try:
+            with zipfile.ZipFile(path) as archive:
+                steps = int(json.loads(archive.read("data"))["num_timesteps"])
+        except (OSError, KeyError, TypeError, ValueError, zipfile.BadZipFile):
+            steps = name_steps(os.path.basename(path))
+        if len(_steps_cache) > 1024: # rewritten checkpoints leave stale keys behind
+            _steps_cache.clear()
+        _steps_cache[key] = steps
+    return steps
+
+
+def checkpoint_rank(path):
+    """Sort key: most trained first, the newest one on ties."""
+    return (checkpoint_steps(path), os.path.getmtime(path))
+
+
+def latest_checkpoint(models_dir=MODELS_DIR):
+    """Path of the checkpoint to serve or fine-tune in models_dir, or None."""
+    if not os.path.isdir(models_dir):
+        return None
+    models = [os.path.join(models_dir, f) for f in os.listdir(models_dir) if f.endswith('.zip')]
+    ranked = []
+    for path in models:
+        try:
+            ranked.append((checkpoint_rank(path), path))
+        except OSError: # deleted while scanning
+            continue
+    return max(ranked)[1] if ranked else None
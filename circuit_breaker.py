@@ -0,0 +1,106 @@
+"""
+Circuit breaker around policy inference.
+
+When inference starts failing or getting slow (deadline misses, errors, calls
+slower than `slow_call_seconds`), waiting for each request's deadline to expire
+only makes every response slow. The breaker watches the outcome of the last
+`window` calls; once at least `min_calls` are recorded and the failure rate or
+the slow-call rate crosses its threshold, it opens: allow() returns False and
+the API answers with the heuristic right away. After `open_seconds` it lets
+`half_open_calls` probe calls through; if they all succeed it closes again,
+any failure re-opens it.
+"""
+import time
+from collections import deque
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    def __init__(self, window=50, min_calls=20, failure_rate=0.5, slow_call_seconds=0.1,
+                 slow_call_rate=0.5, open_seconds=5.0, half_open_calls=5):
+        self.window = max(1, int(window))
+        self.min_calls = max(1, int(min_calls))
+        self.failure_rate_threshold = float(failure_rate)
+        self.slow_call_seconds = float(slow_call_seconds)
+        self.slow_call_rate_threshold = float(slow_call_rate)
+        self.open_seconds = float(open_seconds)
+        self.half_open_calls = max(1, int(half_open_calls))
+
+        self.state = CLOSED
+        self.outcomes = deque(maxlen=self.window) # (failed, slow) of the last calls
+        self.opened_at = None
+        self.probes_started = 0
+        self.probes_succeeded = 0
+        self.times_opened = 0
+        self.rejected = 0
+
+    def allow(self):
+        """Whether the next call may go to the model."""
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < self.open_seconds:
+                self.rejected += 1
+                return False
+            self.state = HALF_OPEN
+            self.probes_started = self.probes_succeeded = 0
+        if self.state == HALF_OPEN:
+            if self.probes_started >= self.half_open_calls:
+                self.rejected += 1
+                return False
+            self.probes_started += 1
+        return True
+
+    def release(self):
+        """A call that allow() let through but that never reached the model (shed)."""
+        if self.state == HALF_OPEN and self.probes_started > 0:
+            self.probes_started -= 1
+
+    def record(self, ok, latency_seconds):
+        """Outcome of a call that allow() let through."""
+        slow = latency_seconds > self.slow_call_seconds
+        if self.state == HALF_OPEN:
+            if not ok or slow:
+                self._open()
+                return
+            self.probes_succeeded += 1
+            if self.probes_succeeded >= self.half_open_calls:
+                self.state = CLOSED
+                self.outcomes.clear()
+            return
+        if self.state == OPEN:
+            # Late result of a call started before the breaker opened
+            return
+
+        self.outcomes.append((not ok, slow))
+        if len(self.outcomes) >= self.min_calls:
+            failure_rate, slow_rate = self._rates()
+            if failure_rate >= self.failure_rate_threshold or slow_rate >= self.slow_call_rate_threshold:
+                self._open()
+
+    def _open(self):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.times_opened += 1
+        self.outcomes.clear()
+
+    def _rates(self):
+        n = len(self.outcomes)
+        if not n:
+            return 0.0, 0.0
+        return sum(f for f, _ in self.outcomes) / n, sum(s for _, s in self.outcomes) / n
+
+    def stats(self):
+        failure_rate, slow_rate = self._rates()
+        return {
+            "state": self.state,
+            "open": self.state != CLOSED,
+            "calls_in_window": len(self.outcomes),
+            "failure_rate": failure_rate,
+            "slow_call_rate": slow_rate,
+            "slow_call_ms": self.slow_call_seconds * 1000,
+            "open_seconds": self.open_seconds,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,94 @@
+"""
+Fast JSON path for the prediction API.
+
+For an 8-feature model, going through FastAPI's generic body handling
+(json.loads, pydantic validation, response_model validation, jsonable_encoder,
+json.dumps) costs more CPU than the prediction itself. api.py reads the raw
+body and decodes it with orjson when it is installed (stdlib json otherwise).
+It checks the usual payload against type rules compiled once from the pydantic
+model and writes the response dict straight to bytes. Anything the rules do not
+accept as-is goes through pydantic as before: coercions, origin/destination
+lookup and error messages are unchanged.
+
+Measure with: python bench_serialization.py
+"""
+import json
+import types
+from typing import Union, get_args, get_origin
+
+try:
+    import orjson
+except ImportError: # optional: pip install orjson
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+if orjson is not None:
+    loads = orjson.loads
+    JSONDecodeError = orjson.JSONDecodeError
+
+    def dumps(obj):
+        """Compact UTF-8 JSON bytes."""
+        return orjson.dumps(obj)
+else:
+    loads = json.loads
+    JSONDecodeError = json.JSONDecodeError
+    _encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+    def dumps(obj):
+        """Compact UTF-8 JSON bytes."""
+        return _encoder.encode(obj).encode("utf-8")
+
+# JSON value types a pydantic field of this annotation takes unchanged. bool is
+# excluded from the numbers on purpose (type(True) is not int): rare inputs go to pydantic.
+_PASS_THROUGH_TYPES = {
+    str: (str,),
+    float: (float, int),
+    int: (int,),
+    bool: (bool,),
+}
+
+
+class CompiledValidator:
+    """
+    Type rules of a pydantic model's fields, compiled once.
+
+    check(payload) returns an attribute view of the payload when every field
+    holds a value the model would accept unchanged and the fields in
+    `required` are all present. Otherwise it returns None and the caller
+    validates with pydantic, which is the reference for everything else.
+    Field-level rules only: fields listed in `required` are the ones whose
+    absence would trigger the model's own validators.
+    """
+
+    def __init__(self, model, required=()):
+        self.model = model
+        self.rules = []
+        for name, field in model.model_fields.items():
+            annotation, nullable = field.annotation, False
+            if get_origin(annotation) in (Union, types.UnionType):
+                args = [arg for arg in get_args(annotation) if arg is not type(None)]
+                if len(args) != 1:
+                    raise TypeError(f"{model.__name__}.{name}: unsupported annotation {annotation}")
+                annotation, nullable = args[0], True
+            if annotation not in _PASS_THROUGH_TYPES or field.metadata:
+                # Constraints (Field(gt=...), max_length...) are pydantic's job
+                raise TypeError(f"{model.__name__}.{name}: unsupported annotation {annotation}")
+            must_have = field.is_required() or name in required or not nullable
+            self.rules.append((name, _PASS_THROUGH_TYPES[annotation], must_have, annotation is float))
+
+    def check(self, payload):
+        if type(payload) is not dict:
+            return None
+        values = {}
+        for name, accepted, must_have, is_float in self.rules:
+            value = payload.get(name)
+            if value is None:
+                if must_have:
+                    return None
+            elif type(value) not in accepted:
+                return None
+            elif is_float and type(value) is int:
+                value = float(value)
+            values[name] = value
+        return types.SimpleNamespace(**values)
@@ -3,14 +3,15 @@ Compare different training checkpoints to see learning progress.
 """
 import os
 import numpy as np
-from stable_baselines3 import PPO
 from env import TravelCostEnv
+from numpy_policy import load_policy
+from checkpoints import checkpoint_rank, checkpoint_steps
 import matplotlib.pyplot as plt
 
 def evaluate_checkpoint(model_path, num_episodes=100):
     """Evaluate a single checkpoint."""
     env = TravelCostEnv()
-    model = PPO.load(model_path, env=env)
+    model = load_policy(model_path, prefer_numpy=False)
     
     errors = []
     
@@ -37,8 +38,8 @@ def compare_checkpoints():
         print("❌ No trained models found.")
         return
     
-    # Sort by timesteps
-    model_files.sort(key=lambda x: int(x.replace('.zip', '')))
+    # Sort by the training steps saved in each checkpoint, as the API ranks them (see checkpoints.py)
+    model_files.sort(key=lambda x: checkpoint_rank(os.path.join(models_dir, x)))
     
     print("="*60)
     print("📊 COMPARING TRAINING CHECKPOINTS")
@@ -53,9 +54,9 @@ def compare_checkpoints():
     
     for model_file in model_files:
         model_path = os.path.join(models_dir, model_file)
-        timestep = int(model_file.replace('.zip', ''))
+        timestep = checkpoint_steps(model_path)
         
-        print(f"Evaluating {timestep:,} timesteps...", end=" ")
+        print(f"Evaluating {model_file} ({timestep:,} timesteps)...", end=" ")
         
         try:
             errors = evaluate_checkpoint(model_path, num_episodes=100)
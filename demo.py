@@ -1,6 +1,6 @@
 import gymnasium as gym
-from stable_baselines3 import PPO
 from env import TravelCostEnv
+from numpy_policy import load_policy
 import numpy as np
 
 def run_demo():
@@ -13,10 +13,10 @@ def run_demo():
     model_path = "models/PPO/100000.zip" 
     
     try:
-        model = PPO.load(model_path, env=env)
+        model = load_policy(model_path, prefer_numpy=False)
     except:
         print(f"Could not load {model_path}. Trying 10000.zip...")
-        model = PPO.load("models/PPO/10000.zip", env=env)
+        model = load_policy("models/PPO/10000.zip", prefer_numpy=False)
 
     print("\n--- Running 5 Test Predicitons ---\n")
     
@@ -0,0 +1,240 @@
+"""
+Origin/destination distance matrix for the prediction API.
+
+The frontend knows the trip's places (depart_osm, destination_osm) but has to
+ask a routing service for distance_km before calling the API. This module
+compiles, offline, a local road graph into dense place x place matrices:
+
+    distance_km.npy   float32, shortest road distance (NaN: no route)
+    road_type.npy     int8, road type covering most of the route's kilometres (0/1/2)
+    wide_road.npy     int8, 1 if at least half of the route's kilometres are wide roads
+    places.json       place identifiers, in matrix order
+
+The API opens the .npy files with np.load(mmap_mode="r"): a lookup reads one
+cell of the mapped file, and the pages live in the OS page cache, shared by all
+workers (prefork.py, api_std.py threads) instead of being copied per process.
+
+Build (edge list: CSV with source,target,distance_km and optionally
+etat_route = bonne/moyenne/mauvaise and routes_larges = oui/non):
+    python distance_matrix.py build edges.csv --output od_matrix
+    python distance_matrix.py lookup od_matrix <depart_osm> <destination_osm>
+"""
+from features import DEFAULT_ROAD_TYPE, ROAD_TYPES, road_code, yes_flag
+from heapq import heappop, heappush
+import argparse
+import csv
+import json
+import logging
+import math
+import os
+import time
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ROAD_NAMES = {code: name for name, code in ROAD_TYPES.items()}
+MATRIX_FILES = ("distance_km.npy", "road_type.npy", "wide_road.npy")
+ROUTE_FIELDS = ("distance_km", "etat_route", "routes_larges")
+
+
+class DistanceMatrix:
+    """Read-only view of a matrix directory written by build()."""
+
+    def __init__(self, directory):
+        with open(os.path.join(directory, "places.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        self.directory = directory
+        self.meta = meta
+        self.index = {str(place): i for i, place in enumerate(meta["places"])}
+        self.distance_km, self.road_type, self.wide_road = (
+            np.load(os.path.join(directory, name), mmap_mode="r") for name in MATRIX_FILES
+        )
+        if self.distance_km.shape != (len(self.index), len(self.index)):
+            raise ValueError(f"{directory}: matrix shape {self.distance_km.shape} does not match {len(self.index)} places")
+        self.lookups = 0
+        self.misses = 0
+
+    @classmethod
+    def open_if_present(cls, directory):
+        """The matrix in `directory`, or None if there is none (O/D mode disabled)."""
+        if not directory or not os.path.exists(os.path.join(directory, "places.json")):
+            return None
+        matrix = cls(directory)
+        logger.info("O/D distance matrix loaded from %s: %d places", directory, len(matrix.index))
+        return matrix
+
+    def route(self, origin, destination):
+        """
+        Payload fields of the route between two places:
+        {"distance_km", "etat_route", "routes_larges"}, or None if either place
+        is unknown or there is no route between them.
+        """
+        self.lookups += 1
+        i = self.index.get(str(origin))
+        j = self.index.get(str(destination))
+        if i is None or j is None:
+            self.misses += 1
+            return None
+        distance = float(self.distance_km[i, j])
+        if math.isnan(distance):
+            self.misses += 1
+            return None
+        return {
+            "distance_km": round(distance, 3),
+            "etat_route": ROAD_NAMES[int(self.road_type[i, j])],
+            "routes_larges": "oui" if self.wide_road[i, j] else "non",
+        }
+
+    def complete_payload(self, payload):
+        """
+        Fill each route field missing (absent or null) from a raw JSON payload
+        from its depart_osm/destination_osm; fields that were sent are kept.
+        Raises ValueError if the route is unknown.
+        """
+        missing = [field for field in ROUTE_FIELDS if payload.get(field) is None]
+        if not missing or payload.get("depart_osm") is None or payload.get("destination_osm") is None:
+            return payload
+        route = self.route(payload["depart_osm"], payload["destination_osm"])
+        if route is None:
+            raise ValueError(f"no route between {payload['depart_osm']} and {payload['destination_osm']}")
+        return {**payload, **{field: route[field] for field in missing}}
+
+    def stats(self):
+        return {
+            "places": len(self.index),
+            "lookups": self.lookups,
+            "misses": self.misses,
+            "built_at": self.meta.get("built_at"),
+            "source": self.meta.get("source"),
+        }
+
+
+def read_edges(path):
+    """(source, target, distance_km, road_type, wide) tuples of an edge-list CSV."""
+    with open(path, newline="", encoding="utf-8") as f:
+        for line, row in enumerate(csv.DictReader(f), start=2):
+            try:
+                distance = float(row["distance_km"])
+            except (KeyError, TypeError, ValueError):
+                raise ValueError(f"{path}:{line}: invalid distance_km {row.get('distance_km')!r}")
+            if distance < 0:
+                raise ValueError(f"{path}:{line}: negative distance_km")
+            road = road_code(row["etat_route"]) if row.get("etat_route") else DEFAULT_ROAD_TYPE
+            wide = yes_flag(row["routes_larges"]) if row.get("routes_larges") else 0
+            yield row["source"], row["target"], distance, road, wide
+
+
+def shortest_routes(adjacency, source):
+    """
+    Dijkstra from `source`. Returns (distance, km_by_road, wide_km) lists: the
+    route length to every node and how many of its kilometres are of each road
+    type / on wide roads (inherited along the shortest-path tree).
+    """
+    n = len(adjacency)
+    distance = [math.inf] * n
+    km_by_road = [None] * n
+    wide_km = [0.0] * n
+    distance[source] = 0.0
+    km_by_road[source] = (0.0, 0.0, 0.0)
+    heap = [(0.0, source)]
+    while heap:
+        d, u = heappop(heap)
+        if d > distance[u]:
+            continue
+        for v, length, road, wide in adjacency[u]:
+            candidate = d + length
+            if candidate < distance[v]:
+                distance[v] = candidate
+                km = list(km_by_road[u])
+                km[road] += length
+                km_by_road[v] = km
+                wide_km[v] = wide_km[u] + length * wide
+                heappush(heap, (candidate, v))
+    return distance, km_by_road, wide_km
+
+
+def build(edges_path, output_dir, directed=False):
+    """
+    Compile an edge list into a matrix directory. One Dijkstra per place, rows
+    written straight into the memory-mapped output files.
+    """
+    started = time.perf_counter()
+    index = {}
+    adjacency = []
+    for source, target, length, road, wide in read_edges(edges_path):
+        for place in (source, target):
+            if place not in index:
+                index[place] = len(index)
+                adjacency.append([])
+        adjacency[index[source]].append((index[target], length, road, wide))
+        if not directed:
+            adjacency[index[target]].append((index[source], length, road, wide))
+    n = len(index)
+    if n == 0:
+        raise ValueError(f"{edges_path}: no edges")
+
+    os.makedirs(output_dir, exist_ok=True)
+    places_path = os.path.join(output_dir, "places.json")
+    if os.path.exists(places_path):
+        os.remove(places_path)
+    open_output = lambda name, dtype: np.lib.format.open_memmap(
+        os.path.join(output_dir, name), mode="w+", dtype=dtype, shape=(n, n)
+    )
+    distance_km = open_output("distance_km.npy", np.float32)
+    road_type = open_output("road_type.npy", np.int8)
+    wide_road = open_output("wide_road.npy", np.int8)
+
+    no_route = (0.0, 0.0, 0.0)
+    for i in range(n):
+        distance, km_by_road, wide_km = shortest_routes(adjacency, i)
+        distance = np.array(distance)
+        km = np.array([k if k is not None else no_route for k in km_by_road])
+        # Most kilometres wins; ties go to the worse road (argmax over reversed columns)
+        roads = 2 - np.argmax(km[:, ::-1], axis=1)
+        roads[~(distance > 0)] = DEFAULT_ROAD_TYPE # same place or no route
+        distance_km[i] = np.where(np.isinf(distance), np.nan, distance)
+        road_type[i] = roads
+        wide_road[i] = (distance > 0) & ~np.isinf(distance) & (np.array(wide_km) * 2 >= distance)
+
+    for matrix in (distance_km, road_type, wide_road):
+        matrix.flush()
+    del distance_km, road_type, wide_road
+
+    # Written last: a directory without places.json is ignored by open_if_present()
+    with open(places_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "places": list(index),
+            "source": os.path.basename(edges_path),
+            "directed": directed,
+            "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }, f)
+    return n, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Origin/destination distance matrix for the API")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="Compile an edge-list CSV into a matrix directory")
+    build_parser.add_argument("edges", help="CSV with source,target,distance_km[,etat_route][,routes_larges]")
+    build_parser.add_argument("--output", default="od_matrix", help="Output directory (default: od_matrix)")
+    build_parser.add_argument("--directed", action="store_true", help="Edges are one-way (default: both ways)")
+    lookup_parser = commands.add_parser("lookup", help="Print the route between two places")
+    lookup_parser.add_argument("directory")
+    lookup_parser.add_argument("origin")
+    lookup_parser.add_argument("destination")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        n, seconds = build(args.edges, args.output, directed=args.directed)
+        size_mb = sum(os.path.getsize(os.path.join(args.output, name)) for name in MATRIX_FILES) / 1e6
+        print(f"✅ {n} places -> {args.output}/ ({size_mb:.1f} MB) in {seconds:.1f}s")
+    else:
+        route = DistanceMatrix(args.directory).route(args.origin, args.destination)
+        if route is None:
+            print(f"❌ No route between {args.origin} and {args.destination}")
+        else:
+            print(json.dumps(route, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,6 @@
 import gymnasium as gym
 from gymnasium import spaces
 import numpy as np
-import random
 from simulation import calculate_true_cost
 
 class TravelCostEnv(gym.Env):
@@ -11,11 +10,11 @@ class TravelCostEnv(gym.Env):
     """
     metadata = {'render.modes': ['human']}
 
-    def __init__(self, feedback_data=None):
+    def __init__(self, feedback_data=None, feedback_offset=0):
         super(TravelCostEnv, self).__init__()
         
         self.feedback_data = feedback_data
-        self.feedback_index = 0
+        self.feedback_index = feedback_offset # parallel workers start at different samples
         
         # State Space (Observation):
         # 1. Distance (km) - 0 to 1000
@@ -48,21 +47,23 @@ class TravelCostEnv(gym.Env):
             self.actual_cost = sample['actual_cost']
             self.feedback_index += 1
         else:
-            # Generate a random trip scenario
-            distance = np.random.uniform(1, 500) # 1km to 500km
-            road_type = np.random.randint(0, 3)
-            traffic = np.random.randint(0, 3)
-            rain = np.random.uniform(0, 1)
-            night = 1 if np.random.random() > 0.7 else 0
-            accident = 1 if np.random.random() > 0.9 else 0 # 10% chance
-            luggage = 1 if np.random.random() > 0.5 else 0
-            wide_road = 1 if np.random.random() > 0.5 else 0
+            # Generate a random trip scenario. self.np_random (seeded by reset(seed=...))
+            # rather than the global generators: parallel workers get independent trips
+            rng = self.np_random
+            distance = float(rng.uniform(1, 500)) # 1km to 500km
+            road_type = int(rng.integers(0, 3))
+            traffic = int(rng.integers(0, 3))
+            rain = float(rng.uniform(0, 1))
+            night = 1 if rng.random() > 0.7 else 0
+            accident = 1 if rng.random() > 0.9 else 0 # 10% chance
+            luggage = 1 if rng.random() > 0.5 else 0
+            wide_road = 1 if rng.random() > 0.5 else 0
             
             self.current_state = np.array([distance, road_type, traffic, rain, night, accident, luggage, wide_road], dtype=np.float32)
             
             # Calculate Ground Truth
             self.actual_cost = calculate_true_cost(
-                distance, road_type, traffic, rain, bool(night), bool(accident), bool(luggage), bool(wide_road)
+                distance, road_type, traffic, rain, bool(night), bool(accident), bool(luggage), bool(wide_road), rng=rng
             )
         
         return self.current_state, {}
@@ -1,6 +1,6 @@
 import gymnasium as gym
-from stable_baselines3 import PPO
 from env import TravelCostEnv
+from numpy_policy import load_policy
 import numpy as np
 import matplotlib.pyplot as plt
 import os
@@ -13,7 +13,7 @@ def evaluate_model(model_path, num_episodes=100):
     env = TravelCostEnv()
     
     try:
-        model = PPO.load(model_path, env=env)
+        model = load_policy(model_path, prefer_numpy=False)
     except Exception as e:
         print(f"Error loading model: {e}")
         return None
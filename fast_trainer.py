@@ -1,34 +1,194 @@
 import gymnasium as gym
 from stable_baselines3 import PPO
-from env import TravelCostEnv
+from checkpoints import latest_checkpoint
+from normalization import Normalization
+from simulation import sample_trips
+from vec_env import make_training_env, ppo_batch_params
+import argparse
+import json
 import os
 import time
+import numpy as np
+import torch
+import torch.nn as nn
 
-def accelerate_training(total_timesteps=200000, checkpoint_freq=50000):
+def feedback_dataset(path):
+    """(observations, costs) of an online_learning feedback_history.json."""
+    with open(path, encoding="utf-8") as f:
+        history = json.load(f)
+    observations, costs = [], []
+    for feedback in history:
+        obs = list(feedback["observation"])
+        if feedback.get("actual_cost", 0) <= 0 or len(obs) > 8:
+            continue
+        # Older records only have the first 6 features: no luggage, no wide road
+        observations.append(obs + [0.0] * (8 - len(obs)))
+        costs.append(feedback["actual_cost"])
+    return np.array(observations, dtype=np.float32), np.array(costs, dtype=np.float64)
+
+def fit_actor(model, observations, costs, epochs=15, batch_size=1024, learning_rate=3e-3, validation=0.05, seed=0,
+              normalization=None):
+    """
+    Supervised warm start: fit the mean of the PPO actor (policy_net + action_net)
+    to the true costs with minibatch regression, instead of learning them through
+    the policy gradient.
+
+    Raw checkpoint: the loss is the squared relative error ((predicted - cost) / cost)^2,
+    the first-order log-cost error, so a 100 CFA trip counts as much as a 100 000 CFA
+    one; a log() of the raw output would have no gradient once a prediction is <= 0.
+    Training runs on standardised observations and on costs in units of their
+    median, both folded back into the first and last linear layers afterwards:
+    the checkpoint is a plain MlpPolicy that loads with PPO.load.
+
+    With a normalization.Normalization, its observation statistics are updated
+    with the dataset and the actor is fitted by mean squared error to
+    cost_to_action(cost), i.e. on log-cost directly.
+    Returns the validation MAE (CFA) and mean absolute percentage error.
+    """
+    policy = model.policy
+    policy_net = policy.mlp_extractor.policy_net
+    first = [m for m in policy_net if isinstance(m, nn.Linear)][0]
+    head = policy.action_net
+    device = policy.device
+
+    generator = torch.Generator().manual_seed(seed)
+    order = torch.randperm(len(costs), generator=generator)
+    n_val = int(len(costs) * validation) if len(costs) >= 20 else 0
+    val_idx, train_idx = order[:n_val], order[n_val:]
+    y = torch.as_tensor(costs, dtype=torch.float32).to(device)
+
+    if normalization is None:
+        obs = torch.as_tensor(observations, dtype=torch.float32)
+        mean = obs[train_idx].mean(0)
+        std = obs[train_idx].std(0).clamp_min(1e-6)
+        scale = float(y[train_idx].median())
+        x = ((obs - mean) / std).to(device)
+        mean, std = mean.to(device), std.to(device)
+        with torch.no_grad(): # same function, reparametrised
+            first.bias += first.weight @ mean
+            first.weight *= std
+            head.weight /= scale
+            head.bias /= scale
+        to_cost = lambda out: out * scale
+        loss_fn = lambda out, batch: (((out * scale - y[batch]) / y[batch]) ** 2).mean()
+    else:
+        normalization.obs_rms.update(observations[train_idx.numpy()])
+        x = torch.as_tensor(normalization.normalize_obs(observations)).to(device)
+        target = torch.as_tensor(normalization.cost_to_action(costs)).to(device)
+        log_low, log_span = float(normalization.log_low), float(normalization.log_span)
+        to_cost = lambda out: torch.exp(log_low + (out.clamp(-1, 1) + 1) * 0.5 * log_span)
+        loss_fn = lambda out, batch: ((out - target[batch]) ** 2).mean()
+
+    params = list(policy_net.parameters()) + list(head.parameters())
+    optimizer = torch.optim.Adam(params, lr=learning_rate)
+    batches = (len(train_idx) + batch_size - 1) // batch_size
+    schedule = torch.optim.lr_scheduler.OneCycleLR(optimizer, max_lr=learning_rate, total_steps=epochs * batches)
+
+    def validate():
+        if not n_val:
+            return None, None
+        with torch.no_grad():
+            predicted = to_cost(head(policy_net(x[val_idx])).squeeze(-1))
+            error = (predicted - y[val_idx]).abs()
+        return float(error.mean()), float((error / y[val_idx]).mean() * 100)
+
+    policy.train()
+    for epoch in range(1, epochs + 1):
+        shuffled = train_idx[torch.randperm(len(train_idx), generator=generator)]
+        for i in range(batches):
+            batch = shuffled[i * batch_size:(i + 1) * batch_size]
+            loss = loss_fn(head(policy_net(x[batch])).squeeze(-1), batch)
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            schedule.step()
+        mae, mape = validate()
+        if mae is not None:
+            print(f"   epoch {epoch}/{epochs}: validation MAE {mae:,.0f} CFA ({mape:.1f}%)")
+    mae, mape = validate()
+
+    if normalization is None:
+        with torch.no_grad():
+            first.weight /= std
+            first.bias -= first.weight @ mean
+            head.weight *= scale
+            head.bias *= scale
+    else:
+        # PPO's initial std of 1 explores the whole [-1, 1] action range and undoes the fit
+        # in a few updates: start fine-tuning with the exploration of the fit's own error
+        with torch.no_grad():
+            residual = head(policy_net(x[train_idx[:100_000]])).squeeze(-1) - target[train_idx[:100_000]]
+            policy.log_std.fill_(float(np.log(max(float(residual.std()), 0.01))))
+    policy.set_training_mode(False)
+    return mae, mape
+
+def pretrain(model, models_dir, samples=1_000_000, feedback_path=None, epochs=15, seed=None, normalization=None):
+    """
+    Fit the actor on simulated trips (or the feedback history) and save it as
+    pretrained_<steps>.zip: the fit adds no PPO steps, so the warm start ranks
+    with the checkpoint it started from (newer on ties, see checkpoints.py) and
+    below the checkpoints PPO fine-tunes from it.
+    """
+    if feedback_path:
+        observations, costs = feedback_dataset(feedback_path)
+        print(f"📚 {len(costs)} feedbacks loaded from {feedback_path}")
+    else:
+        observations, costs = sample_trips(samples, np.random.default_rng(seed))
+        print(f"📚 {len(costs):,} trips simulated")
+    if not len(costs):
+        raise ValueError("empty dataset")
+
+    started = time.time()
+    mae, mape = fit_actor(model, observations, costs, epochs=epochs, seed=seed or 0, normalization=normalization)
+    os.makedirs(models_dir, exist_ok=True)
+    save_path = os.path.join(models_dir, f"pretrained_{model.num_timesteps}")
+    model.save(save_path)
+    if normalization is not None:
+        normalization.save(save_path)
+    summary = f" (validation MAE {mae:,.0f} CFA, {mape:.1f}%)" if mae is not None else ""
+    print(f"💾 Warm start saved: {save_path}.zip in {time.time() - started:.1f}s{summary}")
+    return save_path + ".zip"
+
+def accelerate_training(total_timesteps=200000, checkpoint_freq=50000, vec_envs=256, seed=None, workers=1,
+                        pretrain_samples=0, feedback_path=None, pretrain_epochs=15, normalize=False):
     """
     Runs an intensive training session to quickly improve the model's accuracy
     across all new features (luggage, wide roads, etc.)
+
+    With pretrain_samples (or feedback_path), the actor is first fitted by
+    supervised regression (see fit_actor); PPO then fine-tunes it for
+    total_timesteps steps (0 to skip).
+
+    normalize trains a new model behind a Normalization (normalization.py); a
+    checkpoint that was trained with one keeps it, whatever `normalize` says.
     """
     print("🚀 Starting Accelerated Self-Improvement Lab...")
     
-    # Initialize Environment
-    env = TravelCostEnv()
-    
     # Path to latest model
     models_dir = "models/PPO"
-    latest_model = None
-    if os.path.exists(models_dir):
-        models = [f for f in os.listdir(models_dir) if f.endswith('.zip')]
-        if models:
-            models.sort(key=lambda x: int(x.replace('.zip', '')))
-            latest_model = os.path.join(models_dir, models[-1])
+    latest_model = latest_checkpoint(models_dir)
+    normalization = Normalization.for_checkpoint(latest_model) if latest_model else None
+    if normalize and latest_model and normalization is None:
+        print(f"⚠️  {latest_model} was trained without normalisation: starting a normalised model from scratch")
+        latest_model = None
+    if normalize and normalization is None:
+        normalization = Normalization()
+    
+    # Initialize Environment (vec_envs trips per step, split across `workers` subprocesses, see vec_env.py)
+    env = make_training_env(vec_envs, seed=seed, workers=workers, normalization=normalization)
+    batch_params = ppo_batch_params(env) # PPO's default 2048 samples per update
 
     if latest_model:
         print(f"📈 Loading existing model for fine-tuning: {latest_model}")
-        model = PPO.load(latest_model, env=env)
+        model = PPO.load(latest_model, env=env, **batch_params)
     else:
         print("🆕 Creating new model from scratch...")
-        model = PPO("MlpPolicy", env, verbose=1)
+        model = PPO("MlpPolicy", env, verbose=1, seed=seed, **batch_params)
+
+    if pretrain_samples or feedback_path:
+        print("🎯 Supervised warm start of the actor...")
+        pretrain(model, models_dir, samples=pretrain_samples, feedback_path=feedback_path, epochs=pretrain_epochs, seed=seed,
+                 normalization=normalization)
 
     # Accelerated Training Loop
     start_time = time.time()
@@ -46,6 +206,8 @@ def accelerate_training(total_timesteps=200000, checkpoint_freq=50000):
         # Save intermediate
         save_path = os.path.join(models_dir, f"improved_{steps_done}")
         model.save(save_path)
+        if normalization is not None:
+            normalization.save(save_path)
         print(f"💾 Checkpoint saved: {save_path}.zip ({steps_done}/{total_timesteps} steps)")
 
     end_time = time.time()
@@ -55,45 +217,23 @@ def accelerate_training(total_timesteps=200000, checkpoint_freq=50000):
     print(f"⏱️  Duration: {duration:.2f} seconds")
     print(f"📍 Final model saved in {models_dir}")
 
-def simulate_api_stress_test(num_requests=100):
-    """
-    Optional: Verifies the API can handle high volume while model is training/loaded
-    """
-    import requests
-    import json
-    import random
-    
-    url = "http://127.0.0.1:8000/predict"
-    print(f"🧪 Stress testing API with {num_requests} random requests...")
-    
-    days = ["lundi", "mardi", "mercredi", "jeudi", "vendredi", "samedi", "dimanche"]
-    roads = ["bonne", "moyenne", "mauvaise"]
-    
-    success = 0
-    for i in range(num_requests):
-        payload = {
-            "distance_km": random.uniform(1, 50),
-            "etat_route": random.choice(roads),
-            "heure": f"{random.randint(0,23)}:{random.randint(0,59)}",
-            "jour_semaine": random.choice(days),
-            "pluie": str(random.choice([0, 0.5, 1])),
-            "bagages": random.choice(["oui", "non"]),
-            "routes_larges": random.choice(["oui", "non"]),
-            "routes_travaux": "non",
-            "accident": str(random.choice([0, 1]))
-        }
-        try:
-            r = requests.post(url, json=payload, timeout=2)
-            if r.status_code == 200:
-                success += 1
-        except:
-            pass
-            
-    print(f"📊 Results: {success}/{num_requests} successful requests.")
-
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Accelerated PPO fine-tuning")
+    parser.add_argument("--timesteps", type=int, default=100000, help="Training steps (default: 100000)")
+    parser.add_argument("--pretrain", type=int, default=0, metavar="SAMPLES", help="Fit the actor on this many simulated trips first, e.g. 1000000")
+    parser.add_argument("--feedback", help="Fit the actor on this feedback history instead (online_learning_data/feedback_history.json)")
+    parser.add_argument("--pretrain-epochs", type=int, default=15, help="Warm-start epochs (default: 15)")
+    parser.add_argument("--vec-envs", type=int, default=256, help="Trips stepped together by TravelCostVecEnv (0: one TravelCostEnv, default: 256)")
+    parser.add_argument("--workers", type=int, default=1, help="Split the --vec-envs trips across this many subprocesses (default: 1; only faster with spare cores and a large --vec-envs)")
+    parser.add_argument("--normalize", action="store_true", help="Train behind the normalisation layer (normalization.py)")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
     # 1. Run the intensive training lab
-    accelerate_training(total_timesteps=100000) # Fast but effective improvement
+    # (python fast_trainer.py --pretrain 1000000 --timesteps 0: warm start only, ~30s)
+    accelerate_training(total_timesteps=args.timesteps, vec_envs=args.vec_envs, seed=args.seed, workers=args.workers,
+                        pretrain_samples=args.pretrain, feedback_path=args.feedback, pretrain_epochs=args.pretrain_epochs,
+                        normalize=args.normalize) # Fast but effective improvement
     
-    # 2. (Optional) Run a quick stress test if the API is up
-    # simulate_api_stress_test(20)
+    # 2. (Optional) Benchmark the API with the new checkpoint:
+    #    python benchmark.py --server api --concurrency 32 --duration 20
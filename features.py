@@ -0,0 +1,159 @@
+"""
+Feature encoding shared by api.py, api_std.py and predict.py.
+
+Maps the French frontend payload (etat_route, heure, jour_semaine, pluie,
+bagages, routes_larges, accident) to the 8-float model observation:
+    [distance, road_type, traffic, rain, night, accident, luggage, wide_road]
+
+The traffic level and the night flag only depend on the day and the hour, so
+they are precomputed in a 7x24 table. The string fields go through small
+memoized parsers, so a batch is encoded column by column into an (N, 8)
+float32 array with one table lookup for traffic and night.
+"""
+from functools import lru_cache
+import numpy as np
+
+OBS_DIM = 8
+
+# "bonne" -> 0 (Paved), "moyenne" -> 1 (Dirt), "mauvaise" -> 2 (Broken)
+ROAD_TYPES = {"bonne": 0, "moyenne": 1, "mauvaise": 2}
+DEFAULT_ROAD_TYPE = 1 # default medium
+
+DAYS = {
+    "lundi": 0, "mardi": 1, "mercredi": 2, "jeudi": 3,
+    "vendredi": 4, "samedi": 5, "dimanche": 6
+}
+DEFAULT_DAY = 0
+DEFAULT_HOUR = 12
+
+# Values used by api_std.py for missing payload fields
+PAYLOAD_DEFAULTS = {
+    "distance_km": 0,
+    "etat_route": "bonne",
+    "heure": "12:00",
+    "jour_semaine": "lundi",
+    "pluie": 0,
+    "bagages": "non",
+    "routes_larges": "non",
+    "accident": "0",
+}
+
+
+def traffic_level(day, hour):
+    """
+    The frontend doesn't send the traffic level, it is inferred:
+    weekday rush hours (7-9, 16-19) -> 2 (High), weekday daytime -> 1 (Medium),
+    weekend 10-18 -> 1, otherwise 0 (Low).
+    """
+    if day < 5:
+        if (7 <= hour <= 9) or (16 <= hour <= 19):
+            return 2
+        if 6 <= hour <= 20:
+            return 1
+        return 0
+    return 1 if 10 <= hour <= 18 else 0
+
+
+def is_night(hour):
+    return 1 if (hour >= 19 or hour < 6) else 0
+
+
+# TRAFFIC_BY_DAY_HOUR[day, hour] and NIGHT_BY_HOUR[hour]
+TRAFFIC_BY_DAY_HOUR = np.array([[traffic_level(d, h) for h in range(24)] for d in range(7)], dtype=np.float32)
+NIGHT_BY_HOUR = np.array([is_night(h) for h in range(24)], dtype=np.float32)
+_TRAFFIC_ROWS = TRAFFIC_BY_DAY_HOUR.tolist()
+_NIGHT_LIST = NIGHT_BY_HOUR.tolist()
+
+
+# Parsers of the raw field values. The frontend sends a handful of distinct
+# strings, so they are memoized; the caches are bounded against arbitrary input.
+
+@lru_cache(maxsize=1024)
+def road_code(etat_route):
+    # .strip() handles spaces like " bonne"
+    return ROAD_TYPES.get(str(etat_route).lower().strip(), DEFAULT_ROAD_TYPE)
+
+
+@lru_cache(maxsize=1024)
+def day_code(jour_semaine):
+    return DAYS.get(str(jour_semaine).lower(), DEFAULT_DAY)
+
+
+@lru_cache(maxsize=4096)
+def hour_code(heure):
+    """Hour of "HH:MM", clipped to 0-23 (the traffic and night rules are constant beyond)."""
+    try:
+        hour = int(heure.split(":")[0])
+    except (AttributeError, ValueError):
+        return DEFAULT_HOUR
+    return min(max(hour, 0), 23)
+
+
+@lru_cache(maxsize=1024)
+def rain_value(pluie):
+    # Frontend sends "0", "0.5", "1"
+    try:
+        return float(pluie)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+@lru_cache(maxsize=256)
+def yes_flag(value):
+    return 1 if str(value).lower() == "oui" else 0
+
+
+@lru_cache(maxsize=256)
+def accident_flag(value):
+    return 1 if str(value) == "1" else 0
+
+
+def encode_columns(distance, etat_route, heure, jour_semaine, pluie, bagages, routes_larges, accident):
+    """Encode N trips given as one sequence per payload field into an (N, 8) float32 array."""
+    n = len(distance)
+    obs = np.empty((n, OBS_DIM), dtype=np.float32)
+    obs[:, 0] = [float(v) for v in distance]
+    obs[:, 1] = [road_code(v) for v in etat_route]
+    hours = np.fromiter((hour_code(v) for v in heure), dtype=np.intp, count=n)
+    days = np.fromiter((day_code(v) for v in jour_semaine), dtype=np.intp, count=n)
+    obs[:, 2] = TRAFFIC_BY_DAY_HOUR[days, hours]
+    obs[:, 3] = [rain_value(v) for v in pluie]
+    obs[:, 4] = NIGHT_BY_HOUR[hours]
+    obs[:, 5] = [accident_flag(v) for v in accident]
+    obs[:, 6] = [yes_flag(v) for v in bagages]
+    obs[:, 7] = [yes_flag(v) for v in routes_larges]
+    return obs
+
+
+def encode_requests(requests):
+    """(N, 8) observations of validated request objects (api.PredictionRequest)."""
+    return encode_columns(
+        [r.distance_km for r in requests],
+        [r.etat_route for r in requests],
+        [r.heure for r in requests],
+        [r.jour_semaine for r in requests],
+        [r.pluie for r in requests],
+        [r.bagages for r in requests],
+        [r.routes_larges for r in requests],
+        [r.accident for r in requests],
+    )
+
+
+def encode_request(request):
+    """Observation of a single request object: same tables, without the array round-trips."""
+    hour = hour_code(request.heure)
+    return np.array([
+        request.distance_km,
+        road_code(request.etat_route),
+        _TRAFFIC_ROWS[day_code(request.jour_semaine)][hour],
+        rain_value(request.pluie),
+        _NIGHT_LIST[hour],
+        accident_flag(request.accident),
+        yes_flag(request.bagages),
+        yes_flag(request.routes_larges),
+    ], dtype=np.float32)
+
+
+def encode_payloads(payloads):
+    """(N, 8) observations of raw JSON payloads (dicts); missing fields take PAYLOAD_DEFAULTS."""
+    return encode_columns(*([p.get(field, default) for p in payloads] for field, default in PAYLOAD_DEFAULTS.items()))
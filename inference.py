@@ -0,0 +1,121 @@
+"""
+Inference executor for the prediction API.
+
+The policy forward pass is synchronous (torch), so running it inside an
+`async def` handler blocks uvicorn's event loop. The InferenceExecutor runs it
+in a bounded thread pool or process pool instead, and sheds load once too many
+jobs are waiting so that latency stays bounded during traffic spikes.
+"""
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+
+
+class InferenceOverloaded(Exception):
+    """Raised when the inference queue is full; the API answers 503 + Retry-After."""
+
+
+def policy_costs(policy, obs):
+    """Run one deterministic policy forward pass over an (N, 8) observation matrix."""
+    actions, _ = policy.predict(obs, deterministic=True)
+    return np.asarray(actions, dtype=np.float64).reshape(len(obs), -1)[:, 0]
+
+
+# Model of a process-pool worker, loaded once by _init_process_worker
+_worker_model = None
+
+
+def _init_process_worker(model_path):
+    global _worker_model
+    from numpy_policy import load_policy
+    _worker_model = load_policy(model_path)
+    # Warm-up so lazy initialisation is not paid by the first request
+    policy_costs(_worker_model, np.zeros((1, 8), dtype=np.float32))
+
+
+def _process_policy_costs(obs):
+    if _worker_model is None:
+        raise RuntimeError("Model not loaded in inference worker")
+    return policy_costs(_worker_model, obs)
+
+
+class InferenceExecutor:
+    """
+    Runs the policy forward pass off the event loop.
+
+    kind="thread": the policy object passed to run() is evaluated in a thread pool.
+    kind="process": each worker process loads its own copy of the checkpoint
+    given to use_model(); the policy passed to run() is then ignored.
+    """
+
+    def __init__(self, kind="thread", workers=1, max_pending=32):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown inference executor kind: {kind}")
+        self.kind = kind
+        self.workers = max(1, int(workers))
+        self.max_pending = max(1, int(max_pending))
+        self.model_path = None
+        self.pool = None
+        self.pending = 0
+        self.rejected = 0
+        self.completed = 0
+
+    def start(self):
+        """Start the thread pool. A process pool starts on the first use_model() call."""
+        if self.pool is None and self.kind == "thread":
+            self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inference")
+
+    def use_model(self, model_path):
+        """
+        Point the process workers at a new checkpoint: a fresh pool is started and
+        the old one finishes its queued jobs in the background. No-op for threads.
+        """
+        self.model_path = model_path
+        if self.kind != "process":
+            return
+        old_pool = self.pool
+        self.pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_process_worker,
+            initargs=(model_path,),
+        )
+        # Spawn and warm up the workers now rather than on the first request
+        warm = np.zeros((1, 8), dtype=np.float32)
+        for future in [self.pool.submit(_process_policy_costs, warm) for _ in range(self.workers)]:
+            future.result()
+        if old_pool is not None:
+            old_pool.shutdown(wait=False)
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=True, cancel_futures=True)
+            self.pool = None
+
+    async def run(self, obs, policy=None):
+        """Score an (N, 8) observation matrix without blocking the event loop."""
+        if self.pool is None:
+            raise RuntimeError("Inference executor is not running")
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise InferenceOverloaded(f"{self.pending} inference jobs pending (max {self.max_pending})")
+        loop = asyncio.get_running_loop()
+        self.pending += 1
+        try:
+            if self.kind == "process":
+                return await loop.run_in_executor(self.pool, _process_policy_costs, obs)
+            return await loop.run_in_executor(self.pool, policy_costs, policy, obs)
+        finally:
+            self.pending -= 1
+            self.completed += 1
+
+    def stats(self):
+        return {
+            "kind": self.kind,
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,244 @@
+"""
+Prometheus text-format metrics for the prediction APIs (api.py and api_std.py).
+
+A small hand-rolled registry: counters, histograms and gauges with label
+values passed positionally, rendered in the text exposition format (0.0.4) on
+GET /metrics. Gauges and component stats (batcher, cache, ...) are read when the
+endpoint is scraped, so the request path only pays for counter increments and
+histogram observations.
+"""
+import asyncio
+import math
+import os
+import threading
+import time
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds, from 50us (table lookup) to 2.5s (cold inference under load)
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if isinstance(value, int) or value.is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount=1.0):
+        with self.lock:
+            self.values[labelvalues] = self.values.get(labelvalues, 0.0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            items = sorted(self.values.items())
+        for labelvalues, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labelvalues -> [per-bucket counts (last one is +Inf), sum]
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        # Linear scan: the bucket lists are short and most observations land early
+        index = 0
+        for bound in self.buckets:
+            if value <= bound:
+                break
+            index += 1
+        with self.lock:
+            series = self.series.get(labelvalues)
+            if series is None:
+                series = self.series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            items = sorted((labelvalues, (list(counts), total)) for labelvalues, (counts, total) in self.series.items())
+        names = self.labelnames + ("le",)
+        for labelvalues, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                labels = _format_labels(names, labelvalues + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """
+    Value read at scrape time from fn(): a number, None (no sample), or a dict
+    mapping label-value tuples to numbers. Without fn, set() stores the value.
+    """
+
+    type_name = "gauge"
+
+    def __init__(self, name, help, labelnames=(), fn=None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.fn = fn
+        self.value = None
+
+    def set(self, value):
+        self.value = value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type_name}"]
+        value = self.fn() if self.fn is not None else self.value
+        samples = value if isinstance(value, dict) else {(): value}
+        for labelvalues, sample in sorted(samples.items()):
+            if sample is not None:
+                lines.append(f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(sample)}")
+        return lines
+
+
+class CallbackCounter(Gauge):
+    """Counter read at scrape time from fn(): a monotonic total kept elsewhere (e.g. CPU time)."""
+
+    type_name = "counter"
+
+
+class StatsCollector:
+    """
+    Exports the numeric entries of a component's stats() dict as gauges named
+    prefix_key, except `counters`: the monotonic entries, which Registry.stats()
+    exports as counters named prefix_key_total.
+    """
+
+    def __init__(self, prefix, help, fn, counters=()):
+        self.prefix = prefix
+        self.help = help
+        self.fn = fn
+        self.counters = frozenset(counters)
+
+    def render(self):
+        lines = []
+        for key, value in self.fn().items():
+            if key in self.counters:
+                continue
+            if isinstance(value, bool):
+                value = int(value)
+            if not isinstance(value, (int, float)):
+                continue
+            name = f"{self.prefix}_{key}"
+            lines += [f"# HELP {name} {self.help}: {key}", f"# TYPE {name} gauge", f"{name} {_format_value(value)}"]
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labelnames=(), fn=None):
+        if fn is not None:
+            return self._add(CallbackCounter(name, help, labelnames, fn))
+        return self._add(Counter(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def gauge(self, name, help, labelnames=(), fn=None):
+        return self._add(Gauge(name, help, labelnames, fn))
+
+    def stats(self, prefix, help, fn, counters=()):
+        for key in counters:
+            self.counter(f"{prefix}_{key}_total", f"{help}: {key}", fn=lambda key=key: fn().get(key))
+        return self._add(StatsCollector(prefix, help, fn, counters))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+def register_process_metrics(registry):
+    """Standard process_* metrics: resident memory, CPU time and start time."""
+    started = time.time()
+    registry.gauge("process_resident_memory_bytes", "Resident memory size in bytes.", fn=process_rss_bytes)
+    registry.counter("process_cpu_seconds_total", "Total user and system CPU time spent in seconds.", fn=time.process_time)
+    registry.gauge("process_start_time_seconds", "Start time of the process since unix epoch in seconds.", fn=lambda: started)
+
+
+def process_rss_bytes():
+    """Current resident set size, or None where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class EventLoopLagMonitor:
+    """
+    Measures how late the event loop wakes up from a sleep of `interval`
+    seconds: any blocking call in a handler shows up as lag.
+    """
+
+    def __init__(self, histogram, interval=0.5):
+        self.histogram = histogram
+        self.interval = float(interval)
+        self.last_lag = None
+        self._task = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.last_lag = max(0.0, time.perf_counter() - started - self.interval)
+            self.histogram.observe(self.last_lag)
@@ -0,0 +1,180 @@
+"""
+Model loading supervisor for the prediction API.
+
+The request path must never scan the models directory or load a checkpoint.
+The ModelSupervisor owns a background thread that loads the model, retries with
+exponential backoff while no checkpoint can be loaded, and publishes the result
+as an immutable ModelHandle. Request handlers only read `supervisor.current`:
+either a ready handle or None, in which case they use the heuristic fallback.
+A failed reload never replaces the last-known-good handle.
+
+Once a model is served, the thread keeps polling locate() every
+`watch_interval` seconds and hot-swaps in any new checkpoint it finds. Swapping
+is a single reference assignment: requests that already hold the previous
+handle finish on it.
+"""
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Optional
+from normalization import norm_path_for
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ModelHandle:
+    """A loaded, warmed-up model and everything derived from it."""
+    policy: Any
+    path: str
+    version: str
+    quote_table: Any = None
+    loaded_at: float = field(default_factory=time.time)
+
+
+class ModelSupervisor:
+    """
+    locate() returns the checkpoint path to serve (or None); load(path) returns a
+    ModelHandle or raises. on_swap(handle) is called before a new handle is published.
+    """
+
+    def __init__(self, locate, load, on_swap=None, retry_initial=1.0, retry_max=300.0, watch_interval=0.0):
+        self.locate = locate
+        self.load = load
+        self.on_swap = on_swap
+        self.retry_initial = float(retry_initial)
+        self.retry_max = float(retry_max)
+        self.watch_interval = float(watch_interval)
+        self.swaps = 0
+
+        self.current: Optional[ModelHandle] = None
+        self.state = "starting"
+        self.attempts = 0
+        self.failures = 0
+        self.last_error = None
+        self.next_retry_in = None
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the background loader thread (loads, then retries with backoff until a model is served)."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="model-supervisor", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        # A handle loaded before start() (pre-forked workers inherit the parent's) is kept
+        if (self.current is not None or self._load_with_retries()) and self.watch_interval > 0:
+            self._watch()
+
+    def _load_with_retries(self):
+        delay = self.retry_initial
+        while not self._stop.is_set():
+            if self.try_load():
+                return True
+            self.state = "retrying" if self.current is None else "ready"
+            self.next_retry_in = delay
+            logger.warning("Model load failed (%s), retrying in %.1fs", self.last_error, delay)
+            if self._stop.wait(delay):
+                return False
+            delay = min(delay * 2, self.retry_max)
+        return False
+
+    def _watch(self):
+        """Poll for new checkpoints; each new file (or new mtime/size, .norm.json included) is tried once."""
+        last_seen = checkpoint_signature(self.current.path)
+        while not self._stop.wait(self.watch_interval):
+            try:
+                path = self.locate()
+            except Exception as e:
+                logger.warning("Checkpoint scan failed: %s", e)
+                continue
+            signature = checkpoint_signature(path)
+            if signature is None or signature == last_seen:
+                continue
+            last_seen = signature
+            logger.info("New checkpoint detected: %s", path)
+            if not self.try_load(path):
+                logger.warning("Reload of %s failed (%s), keeping %s", path, self.last_error, self.current.version)
+
+    def reload(self, path=None):
+        """Load path (default: locate()) now and swap it in. Returns (ok, error)."""
+        ok = self.try_load(path)
+        return ok, None if ok else self.last_error
+
+    def try_load(self, path=None):
+        """
+        Load path (default: locate()) and publish it. Returns True on success.
+        On failure the current handle, if any, stays in service.
+        """
+        with self._lock:
+            self.attempts += 1
+            if self.current is None:
+                self.state = "loading"
+            try:
+                path = path or self.locate()
+                if path is None:
+                    raise FileNotFoundError("no checkpoint found")
+                handle = self.load(path)
+                if self.on_swap is not None:
+                    self.on_swap(handle)
+            except Exception as e:
+                self.failures += 1
+                self.last_error = f"{type(e).__name__}: {e}"
+                if not isinstance(e, FileNotFoundError):
+                    logger.error("Could not load model: %s", self.last_error, exc_info=True)
+                return False
+            if self.current is not None:
+                self.swaps += 1
+            self.current = handle
+            self.state = "ready"
+            self.last_error = None
+            self.next_retry_in = None
+            logger.info("Serving model %s", handle.version)
+            return True
+
+    def stats(self):
+        handle = self.current
+        return {
+            "state": self.state,
+            "model_version": handle.version if handle else None,
+            "model_path": handle.path if handle else None,
+            "loaded_at": handle.loaded_at if handle else None,
+            "attempts": self.attempts,
+            "failures": self.failures,
+            "swaps": self.swaps,
+            "watch_interval_seconds": self.watch_interval,
+            "last_error": self.last_error,
+            "next_retry_in_seconds": self.next_retry_in,
+        }
+
+
+def checkpoint_signature(path):
+    """
+    (path, mtime, size) of a checkpoint and of its normalisation file, or None
+    if the checkpoint is missing: rewriting either one triggers a reload.
+    """
+    if not path:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    try:
+        norm_stat = os.stat(norm_path_for(path))
+        norm = (norm_stat.st_mtime_ns, norm_stat.st_size)
+    except OSError:
+        norm = None
+    return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size, norm)
@@ -0,0 +1,191 @@
+"""
+Optional normalisation layer between TravelCostEnv and the PPO policy.
+
+The raw environment feeds the policy a distance of 0-1000 km next to 0/1 flags,
+asks for a price in raw FCFA in [0, 500000] and rewards -error/100 plus large
+bonuses: PPO's unit-scale initialisation starts every prediction near 0 CFA and
+needs very long runs to climb out. With a Normalization:
+
+  - observations are standardised with running mean/variance statistics
+    (clipped to +/- clip_obs), frozen outside training;
+  - the policy acts in [-1, 1], mapped log-linearly onto [cost_low, cost_high]
+    FCFA, so a unit of action is the same relative change at 500 and 50 000 CFA;
+  - rewards are divided by their running standard deviation during training.
+
+The statistics are saved next to each checkpoint (models/PPO/100000.zip ->
+models/PPO/100000.norm.json) and load_policy (numpy_policy.py), predict.py,
+evaluate_model.py and online_learning.py apply them automatically: a
+normalised checkpoint still answers in FCFA. Checkpoints without the file are
+used as before. NumPy only, so the API's torch-free path stays torch-free.
+
+Training side: vec_env.NormalizeVecEnv, train_agent.py / fast_trainer.py --normalize.
+Measure with: python bench_normalization.py
+"""
+import json
+import logging
+import os
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+
+
+def norm_path_for(model_path):
+    """models/PPO/100000.zip -> models/PPO/100000.norm.json"""
+    return os.path.splitext(model_path)[0] + ".norm.json"
+
+
+class RunningMeanStd:
+    """Running mean/variance, merged batch by batch (parallel algorithm)."""
+
+    def __init__(self, shape=(), mean=None, var=None, count=1e-4):
+        self.mean = np.zeros(shape, dtype=np.float64) if mean is None else np.asarray(mean, dtype=np.float64)
+        self.var = np.ones(shape, dtype=np.float64) if var is None else np.asarray(var, dtype=np.float64)
+        self.count = float(count)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).reshape((-1,) + self.mean.shape)
+        batch_count = len(values)
+        if not batch_count:
+            return
+        batch_mean, batch_var = values.mean(axis=0), values.var(axis=0)
+        delta = batch_mean - self.mean
+        total = self.count + batch_count
+        self.mean = self.mean + delta * batch_count / total
+        self.var = (self.var * self.count + batch_var * batch_count + delta ** 2 * self.count * batch_count / total) / total
+        self.count = total
+
+
+class Normalization:
+    def __init__(self, obs_dim=8, clip_obs=10.0, cost_low=100.0, cost_high=500000.0, epsilon=1e-8):
+        self.obs_rms = RunningMeanStd((obs_dim,))
+        self.reward_rms = RunningMeanStd(())
+        self.clip_obs = float(clip_obs)
+        self.cost_low = float(cost_low)
+        self.cost_high = float(cost_high)
+        self.epsilon = float(epsilon)
+        self.log_low = np.log(self.cost_low)
+        self.log_span = np.log(self.cost_high) - self.log_low
+
+    def normalize_obs(self, obs):
+        scaled = (np.asarray(obs, dtype=np.float64) - self.obs_rms.mean) / np.sqrt(self.obs_rms.var + self.epsilon)
+        return np.clip(scaled, -self.clip_obs, self.clip_obs).astype(np.float32)
+
+    def action_to_cost(self, actions):
+        """Policy actions in [-1, 1] -> FCFA in [cost_low, cost_high] (log scale); keeps the shape."""
+        actions = np.clip(np.asarray(actions, dtype=np.float64), -1.0, 1.0)
+        return np.exp(self.log_low + (actions + 1.0) * 0.5 * self.log_span).astype(np.float32)
+
+    def cost_to_action(self, costs):
+        """Inverse of action_to_cost (costs clipped to the mapped range)."""
+        costs = np.clip(np.asarray(costs, dtype=np.float64), self.cost_low, self.cost_high)
+        return ((np.log(costs) - self.log_low) / self.log_span * 2.0 - 1.0).astype(np.float32)
+
+    def scale_reward(self, rewards):
+        return (np.asarray(rewards, dtype=np.float64) / np.sqrt(self.reward_rms.var + self.epsilon)).astype(np.float32)
+
+    def to_dict(self):
+        return {
+            "version": FORMAT_VERSION,
+            "obs_mean": self.obs_rms.mean.tolist(),
+            "obs_var": self.obs_rms.var.tolist(),
+            "obs_count": self.obs_rms.count,
+            "reward_var": float(self.reward_rms.var),
+            "reward_count": self.reward_rms.count,
+            "clip_obs": self.clip_obs,
+            "cost_low": self.cost_low,
+            "cost_high": self.cost_high,
+            "epsilon": self.epsilon,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get("version") != FORMAT_VERSION:
+            raise ValueError(f"unsupported normalisation format {data.get('version')!r}")
+        norm = cls(len(data["obs_mean"]), data["clip_obs"], data["cost_low"], data["cost_high"], data["epsilon"])
+        norm.obs_rms = RunningMeanStd(mean=data["obs_mean"], var=data["obs_var"], count=data["obs_count"])
+        norm.reward_rms = RunningMeanStd(var=data["reward_var"], count=data["reward_count"])
+        return norm
+
+    def save(self, model_path):
+        """Write the statistics next to a checkpoint (model.save's path, with or without .zip)."""
+        path = norm_path_for(model_path if model_path.endswith(".zip") else model_path + ".zip")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        return path
+
+    @classmethod
+    def for_checkpoint(cls, model_path):
+        """The normalisation saved with a checkpoint, or None for a raw checkpoint."""
+        path = norm_path_for(model_path)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+
+def action_high(policy):
+    """Upper action bound of a PPO model or NumpyPolicy (1.0 for normalised checkpoints)."""
+    high = getattr(policy, "action_high", None)
+    if high is None:
+        high = policy.action_space.high
+    return float(np.max(high))
+
+
+class NormalizedPolicy:
+    """
+    A policy trained behind a Normalization, answering in raw observations and
+    FCFA like an unnormalised one: predict() has the stable-baselines3 signature.
+    Other attributes are the wrapped policy's.
+    """
+
+    def __init__(self, policy, normalization):
+        self.policy = policy
+        self.normalization = normalization
+
+    def predict(self, observation, state=None, episode_start=None, deterministic=False):
+        actions, state = self.policy.predict(
+            self.normalization.normalize_obs(observation), state=state, episode_start=episode_start, deterministic=deterministic
+        )
+        return self.normalization.action_to_cost(actions), state
+
+    def __getattr__(self, name):
+        return getattr(self.policy, name)
+
+
+def apply_normalization(policy, model_path):
+    """
+    Wrap a loaded checkpoint in its saved normalisation, if any. A normalisation
+    file next to a checkpoint whose actions are not in [-1, 1] is stale (the
+    checkpoint was overwritten by a raw one) and ignored.
+    """
+    try:
+        normalization = Normalization.for_checkpoint(model_path)
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning("Could not load %s: %s", norm_path_for(model_path), e)
+        return policy
+    high = action_high(policy)
+    if normalization is None:
+        if high <= 1.0:
+            logger.warning("%s acts in [-1, 1] but has no %s: predictions are not in FCFA", model_path, norm_path_for(model_path))
+        return policy
+    if high > 1.0:
+        logger.warning("Ignoring %s: %s is not a normalised checkpoint", norm_path_for(model_path), model_path)
+        return policy
+    return NormalizedPolicy(policy, normalization)
+
+
+def load_ppo_model(model_path, env=None, **kwargs):
+    """
+    PPO.load for further training: (model, normalization or None). `env` is a
+    raw environment or VecEnv; it is wrapped in the checkpoint's normalisation
+    (statistics frozen) so the action and observation spaces match.
+    """
+    from stable_baselines3 import PPO
+    from vec_env import normalize_env
+
+    normalization = Normalization.for_checkpoint(model_path)
+    if normalization is not None and env is not None:
+        env = normalize_env(env, normalization, training=False)
+    return PPO.load(model_path, env=env, **kwargs), normalization
@@ -0,0 +1,211 @@
+"""
+NumPy-only inference for the PPO MlpPolicy.
+
+The served model is a tiny MLP (8 inputs -> 64 -> 64 -> 1), yet PPO.load pulls
+in stable-baselines3 and torch. `export_policy` extracts the actor network,
+the action-space clipping bounds and the log-std from a models/PPO/*.zip
+checkpoint into a compact .npz artifact stored next to it. `NumpyPolicy`
+reproduces `model.predict(obs, deterministic=True)` from that file with plain
+NumPy, and `load_policy` picks the .npz when it matches the checkpoint and
+applies the checkpoint's normalisation, if any (normalization.py).
+
+Usage:
+    python numpy_policy.py                  # export every models/PPO/*.zip
+    python numpy_policy.py path/to/model.zip --check
+"""
+import argparse
+import hashlib
+import logging
+import os
+import numpy as np
+from normalization import apply_normalization
+
+ACTIVATIONS = {
+    "tanh": np.tanh,
+    "relu": lambda x: np.maximum(x, 0),
+    "identity": lambda x: x,
+}
+
+logger = logging.getLogger(__name__)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def npz_path_for(model_path):
+    """models/PPO/100000.zip -> models/PPO/100000.npz"""
+    return os.path.splitext(model_path)[0] + ".npz"
+
+
+class NumpyPolicy:
+    """
+    Deterministic actor of an exported MlpPolicy.
+
+    predict() mirrors the stable-baselines3 signature so the API can use either
+    object: it returns (actions, None) with actions clipped to the action space.
+    """
+
+    def __init__(self, weights, biases, activation, action_low, action_high, log_std=None, source=None):
+        self.weights = [np.ascontiguousarray(w, dtype=np.float32) for w in weights]
+        self.biases = [np.ascontiguousarray(b, dtype=np.float32) for b in biases]
+        self.activation = activation
+        self.activation_fn = ACTIVATIONS[activation]
+        self.action_low = np.asarray(action_low, dtype=np.float32)
+        self.action_high = np.asarray(action_high, dtype=np.float32)
+        self.log_std = None if log_std is None else np.asarray(log_std, dtype=np.float32)
+        self.source = source
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            n_layers = int(data["n_layers"])
+            weights = [data[f"w{i}"] for i in range(n_layers)]
+            biases = [data[f"b{i}"] for i in range(n_layers)]
+            return cls(
+                weights,
+                biases,
+                activation=str(data["activation"]),
+                action_low=data["action_low"],
+                action_high=data["action_high"],
+                log_std=data["log_std"] if "log_std" in data else None,
+                source=str(data["source"]) if "source" in data else None,
+            )
+
+    def action_mean(self, obs):
+        """Mean of the Gaussian action distribution for an (N, obs_dim) matrix, before clipping."""
+        x = np.asarray(obs, dtype=np.float32)
+        last = len(self.weights) - 1
+        for i, (w, b) in enumerate(zip(self.weights, self.biases)):
+            x = x @ w.T + b
+            if i < last:
+                x = self.activation_fn(x)
+        return x
+
+    def predict(self, observation, state=None, episode_start=None, deterministic=True):
+        obs = np.asarray(observation, dtype=np.float32)
+        single = obs.ndim == 1
+        if single:
+            obs = obs[None, :]
+        actions = self.action_mean(obs)
+        if not deterministic and self.log_std is not None:
+            actions = actions + np.exp(self.log_std) * np.random.standard_normal(actions.shape).astype(np.float32)
+        actions = np.clip(actions, self.action_low, self.action_high)
+        return (actions[0] if single else actions), None
+
+
+def export_policy(model_path, npz_path=None):
+    """Extract the actor of a PPO MlpPolicy checkpoint into a NumPy .npz file."""
+    import torch.nn as nn
+    from stable_baselines3 import PPO
+    from stable_baselines3.common.distributions import DiagGaussianDistribution
+    from stable_baselines3.common.torch_layers import FlattenExtractor
+
+    npz_path = npz_path or npz_path_for(model_path)
+    model = PPO.load(model_path, device="cpu")
+    policy = model.policy
+
+    if not isinstance(policy.action_dist, DiagGaussianDistribution) or policy.squash_output:
+        raise ValueError(f"{model_path}: only unsquashed Gaussian policies can be exported")
+    if not isinstance(policy.pi_features_extractor, FlattenExtractor) or len(model.observation_space.shape) != 1:
+        raise ValueError(f"{model_path}: only flat vector observations can be exported")
+
+    linears = [m for m in policy.mlp_extractor.policy_net if isinstance(m, nn.Linear)]
+    linears.append(policy.action_net)
+    activation = policy.activation_fn.__name__.lower()
+    if activation not in ACTIVATIONS:
+        raise ValueError(f"{model_path}: unsupported activation {policy.activation_fn.__name__}")
+
+    arrays = {}
+    for i, layer in enumerate(linears):
+        arrays[f"w{i}"] = layer.weight.detach().cpu().numpy().astype(np.float32)
+        arrays[f"b{i}"] = layer.bias.detach().cpu().numpy().astype(np.float32)
+
+    np.savez(
+        npz_path,
+        n_layers=np.array(len(linears)),
+        activation=np.array(activation),
+        action_low=model.action_space.low.astype(np.float32),
+        action_high=model.action_space.high.astype(np.float32),
+        log_std=policy.log_std.detach().cpu().numpy().astype(np.float32),
+        source=np.array(os.path.basename(model_path)),
+        source_sha256=np.array(file_sha256(model_path)),
+        **arrays,
+    )
+    return npz_path
+
+
+def check_parity(model_path, npz_path=None, n_samples=2000, atol=1e-3, rtol=1e-4):
+    """
+    Compare the NumPy policy with model.predict(..., deterministic=True) on random
+    observations. Returns the max absolute difference of the action means.
+    """
+    import torch
+    from stable_baselines3 import PPO
+
+    model = PPO.load(model_path, device="cpu")
+    policy = NumpyPolicy.load(npz_path or npz_path_for(model_path))
+
+    space = model.observation_space
+    rng = np.random.default_rng(0)
+    obs = rng.uniform(space.low, space.high, size=(n_samples, space.shape[0])).astype(np.float32)
+
+    expected_actions, _ = model.predict(obs, deterministic=True)
+    with torch.no_grad():
+        expected_mean = model.policy.get_distribution(torch.as_tensor(obs)).distribution.mean.numpy()
+
+    actions, _ = policy.predict(obs, deterministic=True)
+    mean = policy.action_mean(obs)
+
+    if not np.allclose(mean, expected_mean, atol=atol, rtol=rtol):
+        raise AssertionError(f"{model_path}: action mean mismatch (max diff {np.abs(mean - expected_mean).max():.3g})")
+    if not np.allclose(actions, expected_actions, atol=atol, rtol=rtol):
+        raise AssertionError(f"{model_path}: clipped action mismatch (max diff {np.abs(actions - expected_actions).max():.3g})")
+    return float(np.abs(mean - expected_mean).max())
+
+
+def load_policy(model_path, prefer_numpy=True):
+    """
+    Load a checkpoint for inference.
+
+    Uses the exported .npz (no torch import) when it exists and was exported
+    from this exact checkpoint, otherwise falls back to PPO.load. Either way,
+    a checkpoint trained with normalisation (normalization.py) comes back
+    wrapped so that predict() takes raw observations and returns FCFA.
+    """
+    npz_path = npz_path_for(model_path)
+    if prefer_numpy and os.path.exists(npz_path):
+        try:
+            with np.load(npz_path, allow_pickle=False) as data:
+                source_sha256 = str(data["source_sha256"])
+            if source_sha256 == file_sha256(model_path):
+                return apply_normalization(NumpyPolicy.load(npz_path), model_path)
+            logger.warning("%s is stale (exported from another checkpoint), using PPO.load", npz_path)
+        except Exception as e:
+            logger.warning("Could not load %s: %s", npz_path, e)
+
+    from stable_baselines3 import PPO
+    return apply_normalization(PPO.load(model_path, device="cpu"), model_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export PPO checkpoints to NumPy .npz policies")
+    parser.add_argument("models", nargs="*", help="Checkpoints to export (default: models/PPO/*.zip)")
+    parser.add_argument("--check", action="store_true", help="Verify parity with model.predict after export")
+    args = parser.parse_args()
+
+    paths = args.models
+    if not paths:
+        models_dir = "models/PPO"
+        paths = sorted(os.path.join(models_dir, f) for f in os.listdir(models_dir) if f.endswith(".zip"))
+
+    for path in paths:
+        out = export_policy(path)
+        line = f"✅ {path} -> {out} ({os.path.getsize(out) / 1024:.1f} KB)"
+        if args.check:
+            line += f" | parity OK, max diff {check_parity(path, out):.2e}"
+        print(line)
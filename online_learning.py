@@ -5,6 +5,9 @@ Le système collecte les retours réels et met à jour le modèle en continu.
 import gymnasium as gym
 from stable_baselines3 import PPO
 from env import TravelCostEnv
+from normalization import NormalizedPolicy, load_ppo_model
+from vec_env import normalize_env
+from checkpoints import latest_checkpoint
 import numpy as np
 import os
 import json
@@ -33,12 +36,16 @@ class OnlineLearningPredictor:
         self.feedback_file = "online_learning_data/feedback_history.json"
         
         # Charger le modèle pré-entraîné ou créer un nouveau
+        # Un modèle entraîné avec normalisation (normalization.py) la garde,
+        # figée: observations normalisées, actions converties en FCFA
+        self.normalization = None
         if model_path and os.path.exists(model_path):
             print(f"✅ Chargement du modèle: {model_path}")
-            self.model = PPO.load(model_path, env=self.env)
+            self.model, self.normalization = load_ppo_model(model_path, env=self.env)
         else:
             print("⚠️  Aucun modèle trouvé, création d'un nouveau modèle...")
             self.model = PPO("MlpPolicy", self.env, verbose=0)
+        self.policy = self.model if self.normalization is None else NormalizedPolicy(self.model, self.normalization)
         
         # Charger l'historique des feedbacks
         self.load_feedback_history()
@@ -57,7 +64,7 @@ class OnlineLearningPredictor:
         with open(self.feedback_file, 'w') as f:
             json.dump(self.feedback_history, f, indent=2)
     
-    def predict(self, distance, road_type, traffic, rain, night, accident):
+    def predict(self, distance, road_type, traffic, rain, night, accident, luggage=0, wide_road=0):
         """
         Fait une prédiction pour un voyage.
         
@@ -68,12 +75,14 @@ class OnlineLearningPredictor:
             rain: Intensité de la pluie (0.0 à 1.0)
             night: Nuit (0=Jour, 1=Nuit)
             accident: Accident (0=Non, 1=Oui)
+            luggage: Bagages (0=Non, 1=Oui)
+            wide_road: Route large (0=Non, 1=Oui)
         
         Returns:
             predicted_cost: Coût prédit en CFA
         """
-        observation = np.array([distance, road_type, traffic, rain, night, accident], dtype=np.float32)
-        action, _ = self.model.predict(observation, deterministic=True)
+        observation = np.array([distance, road_type, traffic, rain, night, accident, luggage, wide_road], dtype=np.float32)
+        action, _ = self.policy.predict(observation, deterministic=True)
         predicted_cost = float(action[0])
         
         self.prediction_count += 1
@@ -130,6 +139,8 @@ class OnlineLearningPredictor:
         
         # Créer un environnement spécifique avec les données de feedback uniquement
         update_env = TravelCostEnv(feedback_data=self.feedback_buffer)
+        if self.normalization is not None:
+            update_env = normalize_env(update_env, self.normalization, training=False)
         
         # Assigner l'environnement au modèle pour l'entraînement
         self.model.set_env(update_env)
@@ -143,13 +154,15 @@ class OnlineLearningPredictor:
         self.model.learn(total_timesteps=training_steps, reset_num_timesteps=False)
         
         # Réinitialiser l'environnement de base (si nécessaire)
-        self.model.set_env(self.env)
+        self.model.set_env(self.env if self.normalization is None else normalize_env(self.env, self.normalization, training=False))
         
         self.update_count += 1
         
         # Sauvegarder le modèle mis à jour
         model_save_path = f"online_learning_data/model_update_{self.update_count}.zip"
         self.model.save(model_save_path)
+        if self.normalization is not None:
+            self.normalization.save(model_save_path)
         
         print(f"✅ Modèle mis à jour et sauvegardé: {model_save_path}")
         print(f"   Total de mises à jour: {self.update_count}")
@@ -204,13 +217,7 @@ def interactive_online_learning():
     
     # Trouver le dernier modèle entraîné
     models_dir = "models/PPO"
-    model_path = None
-    
-    if os.path.exists(models_dir):
-        models = [f for f in os.listdir(models_dir) if f.endswith('.zip')]
-        if models:
-            models.sort(key=lambda x: int(x.replace('.zip', '')))
-            model_path = os.path.join(models_dir, models[-1])
+    model_path = latest_checkpoint(models_dir)
     
     # Créer le système d'apprentissage
     print("Configuration:")
@@ -282,13 +289,7 @@ def demo_online_learning():
     
     # Trouver le dernier modèle
     models_dir = "models/PPO"
-    model_path = None
-    
-    if os.path.exists(models_dir):
-        models = [f for f in os.listdir(models_dir) if f.endswith('.zip')]
-        if models:
-            models.sort(key=lambda x: int(x.replace('.zip', '')))
-            model_path = os.path.join(models_dir, models[-1])
+    model_path = latest_checkpoint(models_dir)
     
     predictor = OnlineLearningPredictor(model_path=model_path, update_frequency=5)
     
@@ -306,7 +307,7 @@ def demo_online_learning():
         predicted_cost, observation = predictor.predict(distance, road_type, traffic, rain, night, accident)
         
         # Calculer le coût réel
-        actual_cost = calculate_true_cost(distance, road_type, traffic, rain, bool(night), bool(accident))
+        actual_cost = calculate_true_cost(distance, road_type, traffic, rain, bool(night), bool(accident), False, False)
         
         # Ajouter le feedback
         predictor.add_feedback(observation, predicted_cost, actual_cost)
@@ -1,6 +1,10 @@
 import gymnasium as gym
-from stable_baselines3 import PPO
-from env import TravelCostEnv
+from checkpoints import latest_checkpoint
+from features import PAYLOAD_DEFAULTS, encode_payloads
+from numpy_policy import load_policy
+import argparse
+import csv
+import json
 import numpy as np
 import os
 
@@ -18,11 +22,8 @@ def get_latest_model():
         print("❌ No trained models found. Please train a model first.")
         return None
 
-    # Sort by the number in filename to get the latest
-    models.sort(key=lambda x: int(x.replace('.zip', '')))
-    model_path = os.path.join(models_dir, models[-1])
-
-    return model_path
+    # Same choice as the API (see checkpoints.py)
+    return latest_checkpoint(models_dir)
 
 def get_user_input():
     """Get trip parameters from user input."""
@@ -197,10 +198,10 @@ def interactive_mode():
         return
     
     print(f"\n✅ Loading model from: {model_path}")
-    env = TravelCostEnv()
     
     try:
-        model = PPO.load(model_path, env=env)
+        # Applies the checkpoint's normalisation, if any (normalization.py)
+        model = load_policy(model_path)
         print("✅ Model loaded successfully!")
     except Exception as e:
         print(f"❌ Error loading model: {e}")
@@ -245,10 +246,10 @@ def batch_mode():
         return
     
     print(f"\n✅ Loading model from: {model_path}")
-    env = TravelCostEnv()
     
     try:
-        model = PPO.load(model_path, env=env)
+        # Applies the checkpoint's normalisation, if any (normalization.py)
+        model = load_policy(model_path)
         print("✅ Model loaded successfully!")
     except Exception as e:
         print(f"❌ Error loading model: {e}")
@@ -298,7 +299,50 @@ def batch_mode():
         
         display_prediction(obs, predicted_cost, actual_cost)
 
+def read_payloads(path):
+    """Frontend payloads from a .json list, a .jsonl file (one object per line) or a .csv with a header."""
+    if path.endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            return list(csv.DictReader(f))
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            return [json.loads(line) for line in f if line.strip()]
+        return json.load(f)
+
+def offline_mode(input_path, output_path, chunk_size=65536):
+    """Score a file of frontend payloads with the same encoding as the API and write a CSV."""
+    model_path = get_latest_model()
+    if model_path is None:
+        return
+    
+    print(f"\n✅ Loading model from: {model_path}")
+    model = load_policy(model_path)
+    
+    payloads = read_payloads(input_path)
+    obs = encode_payloads(payloads)
+    costs = np.empty(len(obs), dtype=np.float64)
+    for start in range(0, len(obs), chunk_size):
+        actions, _ = model.predict(obs[start:start + chunk_size], deterministic=True)
+        costs[start:start + chunk_size] = np.asarray(actions).reshape(-1)
+    
+    fields = list(PAYLOAD_DEFAULTS) + ["prix_estime_fcfa"]
+    with open(output_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fields, extrasaction="ignore")
+        writer.writeheader()
+        for payload, cost in zip(payloads, costs.tolist()):
+            writer.writerow({**PAYLOAD_DEFAULTS, **payload, "prix_estime_fcfa": round(cost, 2)})
+    
+    print(f"✅ {len(payloads)} trips scored -> {output_path}")
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cameroon travel cost predictor")
+    parser.add_argument("--score", metavar="PAYLOADS", help="Offline scoring of a .json/.jsonl/.csv file of API payloads")
+    parser.add_argument("--output", default="predictions.csv", help="CSV written by --score (default: predictions.csv)")
+    args = parser.parse_args()
+    if args.score:
+        offline_mode(args.score, args.output)
+        raise SystemExit(0)
+    
     print("\n" + "="*60)
     print("🚗 CAMEROON TRAVEL COST PREDICTOR")
     print("="*60)
@@ -0,0 +1,98 @@
+"""
+Bounded LRU/TTL cache of policy outputs for the prediction API.
+
+Popular routes come back with the same frontend toggles, so the encoded
+observation repeats. The cache key is that observation with the distance
+quantized to `distance_resolution_km`. Entries belong to one model version:
+looking up with another version (a different model was loaded) clears the cache.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class PredictionCache:
+    def __init__(self, max_entries=10000, ttl_seconds=3600.0, distance_resolution_km=0.1):
+        self.max_entries = max(0, int(max_entries))
+        self.ttl = float(ttl_seconds)
+        self.distance_resolution = float(distance_resolution_km)
+        self.model_version = None
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def key(self, obs):
+        """Hashable key of an 8-float observation, distance quantized."""
+        values = obs.tolist() if hasattr(obs, "tolist") else list(obs)
+        return (round(values[0] / self.distance_resolution),) + tuple(values[1:])
+
+    def _check_version(self, model_version):
+        # Caller holds the lock
+        if model_version != self.model_version:
+            if self.entries:
+                self.invalidations += 1
+            self.entries.clear()
+            self.model_version = model_version
+
+    def get(self, obs, model_version):
+        """Cached cost for obs under model_version, or None."""
+        if not self.enabled:
+            return None
+        key = self.key(obs)
+        with self.lock:
+            self._check_version(model_version)
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            cost, expires_at = entry
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return cost
+
+    def put(self, obs, model_version, cost):
+        if not self.enabled:
+            return
+        key = self.key(obs)
+        with self.lock:
+            self._check_version(model_version)
+            self.entries[key] = (cost, time.monotonic() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "distance_resolution_km": self.distance_resolution,
+            "model_version": self.model_version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,154 @@
+"""
+Pre-fork serving mode for api.py.
+
+Running uvicorn with --workers makes every worker import the app and load its
+own copy of the policy and quote table. Here the parent process loads and warms
+up the model once, freezes the garbage collector (gc.freeze, so collections in
+the children never write to the inherited objects) and then forks the workers
+on a shared listening socket. The weights, the quote table and the imported
+modules stay in copy-on-write pages shared by all workers.
+
+Each worker keeps its own model supervisor: a hot reload (see model_supervisor.py)
+happens per worker, and the reloaded model is no longer shared.
+
+Usage:
+    WORKERS=4 WORKER_THREADS=1 python prefork.py
+
+WORKERS (default: WEB_CONCURRENCY, then 1) is the number of worker processes.
+WORKER_THREADS (default 1) caps the BLAS/OpenMP threads and torch intra-op
+threads of each worker, so WORKERS x WORKER_THREADS should not exceed the
+number of CPU cores.
+"""
+import os
+import sys
+
+WORKERS = max(1, int(os.environ.get("WORKERS", os.environ.get("WEB_CONCURRENCY", 1))))
+WORKER_THREADS = max(1, int(os.environ.get("WORKER_THREADS", 1)))
+
+# Read by OpenBLAS/MKL/OpenMP (numpy and torch) when they are first imported,
+# so they must be set before api.py is imported
+for _var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+    os.environ.setdefault(_var, str(WORKER_THREADS))
+
+import gc
+import logging
+import signal
+import socket
+import time
+import traceback
+import uvicorn
+import api
+
+logger = logging.getLogger("prefork")
+
+# A worker that dies sooner than this after being forked is restarted with a delay
+MIN_WORKER_UPTIME_SECONDS = 5.0
+
+
+def pin_torch_threads():
+    """Intra-op threads of torch, if the loaded model imported it."""
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(WORKER_THREADS)
+
+
+def preload_model():
+    """
+    Load and warm up the model in the parent. Returns False when no model could
+    be loaded: the workers then load it themselves (not shared) and retry.
+    """
+    api.log_pipeline.start()
+    try:
+        if api.executor.kind == "process":
+            raise SystemExit("INFERENCE_EXECUTOR=process cannot be combined with prefork.py, use threads")
+        pin_torch_threads()
+        loaded = api.supervisor.try_load()
+        if not loaded:
+            logger.warning("Model preload failed (%s), workers will load it themselves", api.supervisor.last_error)
+        return loaded
+    finally:
+        # Flush now: records still queued at fork time would be written once per worker
+        api.log_pipeline.stop()
+
+
+def run_worker(sock):
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    gc.enable()
+    pin_torch_threads()
+    config = uvicorn.Config(api.app, log_level="info", access_log=False)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def spawn_worker(sock):
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            run_worker(sock)
+        except BaseException:
+            traceback.print_exc()
+            code = 1
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(code)
+    return pid
+
+
+def main():
+    host = os.environ.get("HOST", "0.0.0.0")
+    port = int(os.environ.get("PORT", 8000))
+
+    # No collection between the model load and the fork
+    gc.disable()
+    preload_model()
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    # Everything allocated so far (modules, weights, quote table) is moved to the
+    # permanent generation: the children's collections never touch those pages
+    gc.collect()
+    gc.freeze()
+
+    print(f"Starting {WORKERS} pre-forked Uvicorn workers on http://{host}:{port} ({WORKER_THREADS} thread(s) each)")
+    workers = {spawn_worker(sock): time.monotonic() for _ in range(WORKERS)}
+    gc.enable()
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while workers:
+        try:
+            pid, status = os.waitpid(-1, 0)
+        except ChildProcessError:
+            break
+        started = workers.pop(pid, None)
+        if started is None or stopping:
+            continue
+        # The parent's log pipeline is stopped (see preload_model), print directly
+        print(f"WARNING: Worker {pid} exited (status {status}), restarting it", file=sys.stderr)
+        if time.monotonic() - started < MIN_WORKER_UPTIME_SECONDS:
+            time.sleep(1.0)
+        workers[spawn_worker(sock)] = time.monotonic()
+
+    sock.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Precomputed quote table for the prediction API.
+
+Apart from distance, every observation built from a frontend payload is
+discrete: road_type and traffic in {0, 1, 2}, rain in {0, 0.5, 1} (the values
+the frontend sends) and four 0/1 flags, i.e. 432 combinations. The QuoteTable
+evaluates the policy once over these combinations crossed with a dense
+distance grid, then answers by linear interpolation along distance.
+Observations outside the grid (other rain values, distance above the
+observation space) are reported as not covered and go to the live policy.
+"""
+import itertools
+import logging
+import time
+import numpy as np
+
+ROAD_TYPES = (0, 1, 2)
+TRAFFIC_LEVELS = (0, 1, 2)
+RAIN_LEVELS = (0.0, 0.5, 1.0)
+FLAGS = (0, 1)
+
+logger = logging.getLogger(__name__)
+
+# Rows per policy call while building, keeps the hidden activations small
+BUILD_CHUNK = 65536
+
+# Observation dims 1..7 are mapped to integer levels (rain 0/0.5/1 -> 0/1/2) and
+# then to a row of the flattened (432, n_distances) table
+RESOLUTION_SCALE = np.array([1, 1, 2, 1, 1, 1, 1], dtype=np.float32)
+LEVEL_MAX = np.array([2, 2, 2, 1, 1, 1, 1], dtype=np.float32)
+COMBO_STRIDES = np.array([144, 48, 16, 8, 4, 2, 1], dtype=np.intp)
+RESOLUTION_SCALE_LIST = RESOLUTION_SCALE.tolist()
+LEVEL_MAX_LIST = LEVEL_MAX.tolist()
+COMBO_STRIDES_LIST = COMBO_STRIDES.tolist()
+
+
+class QuoteTable:
+    def __init__(self, curves, distance_step, max_distance, max_abs_error=None, max_rel_error=None):
+        # curves[combo_row, distance_idx], combo rows in itertools.product order
+        self.curves = curves
+        self.distance_step = float(distance_step)
+        self.max_distance = float(max_distance)
+        self.max_abs_error = max_abs_error
+        self.max_rel_error = max_rel_error
+
+    @classmethod
+    def build(cls, policy, distance_step=1.0, max_distance=1000.0):
+        """
+        Evaluate policy.predict over the full grid and measure the interpolation
+        error against the live policy at every distance midpoint.
+        """
+        started = time.perf_counter()
+        distances = np.arange(0.0, max_distance + distance_step / 2, distance_step, dtype=np.float32)
+        combos = np.array(
+            list(itertools.product(ROAD_TYPES, TRAFFIC_LEVELS, RAIN_LEVELS, FLAGS, FLAGS, FLAGS, FLAGS)),
+            dtype=np.float32,
+        )
+
+        values = _evaluate_grid(policy, combos, distances)
+        quote_table = cls(values, distance_step, float(distances[-1]))
+
+        # Accuracy bound: compare interpolated and live values halfway between grid points
+        midpoints = distances[:-1] + np.float32(distance_step / 2)
+        live = _evaluate_grid(policy, combos, midpoints)
+        interpolated = (values[:, :-1] + values[:, 1:]) / 2
+        abs_error = np.abs(interpolated - live)
+        quote_table.max_abs_error = float(abs_error.max()) if abs_error.size else 0.0
+        quote_table.max_rel_error = float((abs_error / np.maximum(np.abs(live), 1.0)).max()) if abs_error.size else 0.0
+
+        logger.info(
+            "Quote table built: %d combinations x %d distances in %.2fs | interpolation error vs live policy: "
+            "max %.2f FCFA (%.3f%%)",
+            len(combos), len(distances), time.perf_counter() - started,
+            quote_table.max_abs_error, quote_table.max_rel_error * 100,
+        )
+        return quote_table
+
+    def lookup(self, obs):
+        """
+        Interpolated costs for an (N, 8) observation matrix.
+
+        Returns (costs, covered): costs is only meaningful where covered is True.
+        """
+        obs = np.asarray(obs, dtype=np.float32)
+        distance = obs[:, 0]
+        levels = obs[:, 1:8] * RESOLUTION_SCALE
+        index = np.rint(levels)
+
+        covered = (
+            (distance >= 0) & (distance <= self.max_distance)
+            & (index == levels).all(axis=1)
+            & (index >= 0).all(axis=1) & (index <= LEVEL_MAX).all(axis=1)
+        )
+        costs = np.zeros(len(obs), dtype=np.float64)
+        if not covered.any():
+            return costs, covered
+
+        rows = index[covered].astype(np.intp) @ COMBO_STRIDES
+        position = distance[covered] / self.distance_step
+        lower = np.minimum(position.astype(np.intp), self.curves.shape[1] - 2)
+        frac = position - lower
+        costs[covered] = self.curves[rows, lower] * (1 - frac) + self.curves[rows, lower + 1] * frac
+        return costs, covered
+
+    def lookup_one(self, obs):
+        """
+        Scalar fast path for a single observation, in plain Python.
+
+        Returns the interpolated cost, or None when the observation is not covered.
+        """
+        distance = float(obs[0])
+        if not 0 <= distance <= self.max_distance:
+            return None
+        row = 0
+        for value, scale, level_max, stride in zip(obs[1:8], RESOLUTION_SCALE_LIST, LEVEL_MAX_LIST, COMBO_STRIDES_LIST):
+            level = float(value) * scale
+            if level != int(level) or not 0 <= level <= level_max:
+                return None
+            row += int(level) * stride
+        position = distance / self.distance_step
+        lower = min(int(position), self.curves.shape[1] - 2)
+        frac = position - lower
+        curve = self.curves[row]
+        return float(curve[lower]) * (1 - frac) + float(curve[lower + 1]) * frac
+
+    def stats(self):
+        return {
+            "entries": int(self.curves.size),
+            "distance_step_km": self.distance_step,
+            "max_distance_km": self.max_distance,
+            "max_abs_error_fcfa": self.max_abs_error,
+            "max_rel_error": self.max_rel_error,
+        }
+
+
+def _evaluate_grid(policy, combos, distances):
+    """Policy outputs for every (combo, distance) pair, shape (len(combos), len(distances))."""
+    obs = np.empty((len(combos) * len(distances), 8), dtype=np.float32)
+    obs[:, 0] = np.tile(distances, len(combos))
+    obs[:, 1:] = np.repeat(combos, len(distances), axis=0)
+
+    values = np.empty(len(obs), dtype=np.float32)
+    for start in range(0, len(obs), BUILD_CHUNK):
+        actions, _ = policy.predict(obs[start:start + BUILD_CHUNK], deterministic=True)
+        values[start:start + BUILD_CHUNK] = np.asarray(actions, dtype=np.float32).reshape(-1)
+    return values.reshape(len(combos), len(distances))
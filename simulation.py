@@ -1,6 +1,13 @@
 import random
+import time
+import numpy as np
 
-def calculate_true_cost(distance_km, road_type, traffic_level, rain_intensity, is_night, accidents_reported, has_luggage, is_wide_road):
+# Multipliers (indexed by code; any other code counts as 1.0)
+ROAD_MULTIPLIERS = (1.0, 1.5, 2.5) # Dirt is harder, Damaged is worst
+TRAFFIC_MULTIPLIERS = (1.0, 1.3, 2.0) # Traffic increases fuel/time
+MIN_COST = 100
+
+def calculate_true_cost(distance_km, road_type, traffic_level, rain_intensity, is_night, accidents_reported, has_luggage, is_wide_road, rng=None):
     """
     Calculates the 'ground truth' cost of a trip based on inputs.
     
@@ -13,6 +20,7 @@ def calculate_true_cost(distance_km, road_type, traffic_level, rain_intensity, i
     - accidents_reported: bool
     - has_luggage: bool
     - is_wide_road: bool
+    - rng: optional np.random.Generator for the noise (default: the global `random`)
     
     Returns:
     - true_cost: float (CFA Francs)
@@ -22,8 +30,8 @@ def calculate_true_cost(distance_km, road_type, traffic_level, rain_intensity, i
     base_rate = 100 
     
     # Multipliers
-    road_multipliers = {0: 1.0, 1: 1.5, 2: 2.5} # Dirt is harder, Damaged is worst
-    traffic_multipliers = {0: 1.0, 1: 1.3, 2: 2.0} # Traffic increases fuel/time
+    road_multipliers = dict(enumerate(ROAD_MULTIPLIERS))
+    traffic_multipliers = dict(enumerate(TRAFFIC_MULTIPLIERS))
     
     cost = distance_km * base_rate
     
@@ -47,12 +55,82 @@ def calculate_true_cost(distance_km, road_type, traffic_level, rain_intensity, i
         cost *= 0.9 # 10% cheaper/faster on wide roads
             
     # Add some random noise to simulate market negotiation/variability (+/- 10%)
-    noise = random.uniform(0.9, 1.1)
+    noise = rng.uniform(0.9, 1.1) if rng is not None else random.uniform(0.9, 1.1)
     cost *= noise
     
-    return max(100, round(cost)) # Minimum 100 CFA
+    return max(MIN_COST, round(cost)) # Minimum 100 CFA
+
+
+def _multiplier(table, codes):
+    """table[code] for the integer codes in range, 1.0 for anything else (like dict.get)."""
+    codes = np.asarray(codes, dtype=np.float64)
+    known = (codes == np.floor(codes)) & (codes >= 0) & (codes < len(table))
+    return np.where(known, np.asarray(table)[np.where(known, codes, 0).astype(np.intp)], 1.0)
+
+
+def calculate_true_cost_batch(distance_km, road_type, traffic_level, rain_intensity, is_night, accidents_reported, has_luggage, is_wide_road, rng):
+    """
+    Vectorized calculate_true_cost: the eight factors are arrays (or scalars)
+    of the same length, the noise comes from `rng` (np.random.Generator), one
+    draw per trip in order. Returns an int64 array of costs.
+
+    Trip i gets exactly the cost calculate_true_cost(..., rng=rng) would give
+    for the i-th call with the same generator state: the modifiers are applied
+    in the same order, in float64, and np.round rounds half to even like round().
+    """
+    cost = np.asarray(distance_km, dtype=np.float64) * 100
+    cost = cost * _multiplier(ROAD_MULTIPLIERS, road_type)
+    cost = cost * _multiplier(TRAFFIC_MULTIPLIERS, traffic_level)
+    # x * 1.0 and x + 0.0 are exact: the trips without a modifier are unchanged
+    cost = cost * np.where(np.asarray(rain_intensity) > 0.5, 1.2, 1.0)
+    cost = cost * np.where(np.asarray(is_night) != 0, 1.15, 1.0)
+    cost = cost * np.where(np.asarray(accidents_reported) != 0, 1.5, 1.0)
+    cost = cost + np.where(np.asarray(has_luggage) != 0, 500.0, 0.0)
+    cost = cost * np.where(np.asarray(is_wide_road) != 0, 0.9, 1.0)
+    cost = cost * rng.uniform(0.9, 1.1, size=cost.shape)
+    return np.maximum(MIN_COST, np.round(cost)).astype(np.int64)
+
+
+def sample_trips(n, rng, distance_range=(1, 500), out=None):
+    """
+    n random trip scenarios drawn like TravelCostEnv.reset(), labelled in one pass.
+    Returns (observations float32 (n, 8), costs int64 (n,)); the observations
+    are written into `out` when given.
+    """
+    distance = rng.uniform(distance_range[0], distance_range[1], size=n)
+    road_type = rng.integers(0, 3, size=n)
+    traffic = rng.integers(0, 3, size=n)
+    rain = rng.uniform(0, 1, size=n)
+    night = rng.random(n) > 0.7
+    accident = rng.random(n) > 0.9 # 10% chance
+    luggage = rng.random(n) > 0.5
+    wide_road = rng.random(n) > 0.5
+    costs = calculate_true_cost_batch(distance, road_type, traffic, rain, night, accident, luggage, wide_road, rng)
+    if out is None:
+        out = np.empty((n, 8), dtype=np.float32)
+    for column, values in enumerate((distance, road_type, traffic, rain, night, accident, luggage, wide_road)):
+        out[:, column] = values
+    return out, costs
+
 
 if __name__ == "__main__":
     # Test
     print(f"Test Trip (10km, Paved, Low Traffic): {calculate_true_cost(10, 0, 0, 0, False, False, False, True)} CFA")
     print(f"Test Trip (10km, Broken, High Traffic, Rain): {calculate_true_cost(10, 2, 2, 0.8, False, False, True, False)} CFA")
+
+    # Batched vs one trip at a time, same seed
+    n = 1_000_000
+    trips = np.random.default_rng(0)
+    columns = (trips.uniform(1, 500, n), trips.integers(0, 3, n), trips.integers(0, 3, n), trips.uniform(0, 1, n),
+               trips.random(n) > 0.7, trips.random(n) > 0.9, trips.random(n) > 0.5, trips.random(n) > 0.5)
+    started = time.perf_counter()
+    batch = calculate_true_cost_batch(*columns, rng=np.random.default_rng(42))
+    batch_seconds = time.perf_counter() - started
+    k = 100_000
+    rows = [tuple(column[i].item() for column in columns) for i in range(k)]
+    rng = np.random.default_rng(42)
+    started = time.perf_counter()
+    scalar = [calculate_true_cost(*row, rng=rng) for row in rows]
+    scalar_seconds = (time.perf_counter() - started) * n / k
+    assert scalar == batch[:k].tolist()
+    print(f"{n} trips: batch {batch_seconds * 1000:.0f} ms, one at a time ~{scalar_seconds:.1f} s (identical costs)")
@@ -0,0 +1,54 @@
+"""
+In-flight deduplication (single-flight) of identical predictions.
+
+During a burst, many identical requests (same route, same minute) miss the
+cache together because none of them has finished yet. SingleFlight runs the
+computation for a key once; requests arriving with the same key while it is
+running await that result instead of starting their own. Nothing is kept once
+the computation ends: completed results are the PredictionCache's job.
+
+The shared computation runs in its own task, so a waiter that gives up (its
+deadline expires, its client disconnects) does not cancel it for the others.
+"""
+import asyncio
+
+
+class SingleFlight:
+    def __init__(self):
+        self.inflight = {}
+        self.leaders = 0
+        self.collapsed = 0
+
+    async def run(self, key, make_coro):
+        """Result of make_coro() for key, shared with the callers already waiting for it."""
+        task = self.join(key) or self.start(key, make_coro)
+        return await asyncio.shield(task)
+
+    def join(self, key):
+        """The task already computing key, or None if the caller has to start() it."""
+        task = self.inflight.get(key)
+        if task is not None:
+            self.collapsed += 1
+        return task
+
+    def start(self, key, make_coro):
+        """Run make_coro() for key; callers arriving before it ends join() it."""
+        self.leaders += 1
+        task = asyncio.get_running_loop().create_task(make_coro())
+        self.inflight[key] = task
+        task.add_done_callback(lambda t: self._done(key, t))
+        return task
+
+    def _done(self, key, task):
+        if self.inflight.get(key) is task:
+            del self.inflight[key]
+        # Nobody may be left to await it: retrieve the exception so it is not logged as unhandled
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self):
+        return {
+            "inflight": len(self.inflight),
+            "leaders": self.leaders,
+            "collapsed": self.collapsed,
+        }
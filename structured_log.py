@@ -0,0 +1,129 @@
+"""
+Structured, asynchronous logging for the prediction API.
+
+print() writes to stdout synchronously under the console lock, which costs more
+than the model's forward pass. Here every record goes through a non-blocking
+QueueHandler; a QueueListener thread formats it as one JSON line and writes it.
+When the queue is full the record is dropped and counted, the request never waits.
+
+Per-request records are sampled (LOG_SAMPLE_RATE) and carry a latency breakdown
+collected with a StageTimer. Warnings and errors are never sampled.
+"""
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import time
+
+# Attributes of a plain LogRecord, everything else passed through extra= is a field
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, message and the extra= fields."""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogPipeline:
+    """
+    Routes the root logger through a bounded queue to a background JSON writer.
+
+    configure() installs the handler (records emitted before start() wait in the
+    queue); start()/stop() run the writer thread and flush on shutdown.
+    """
+
+    def __init__(self, level="INFO", sample_rate=1.0, max_queue=10000, stream=None):
+        self.level = logging.getLevelName(str(level).upper())
+        if not isinstance(self.level, int):
+            raise ValueError(f"Unknown log level: {level}")
+        self.sample_rate = min(1.0, max(0.0, float(sample_rate)))
+        self.queue = queue.Queue(maxsize=max(1, int(max_queue)))
+        self.handler = DroppingQueueHandler(self.queue)
+        output = logging.StreamHandler(stream or sys.stdout)
+        output.setFormatter(JsonFormatter())
+        self.listener = logging.handlers.QueueListener(self.queue, output, respect_handler_level=False)
+        self._running = False
+
+    def configure(self):
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            if isinstance(handler, DroppingQueueHandler):
+                root.removeHandler(handler)
+        root.addHandler(self.handler)
+        root.setLevel(self.level)
+
+    def start(self):
+        if not self._running:
+            self.listener.start()
+            self._running = True
+
+    def stop(self):
+        """Write out the queued records and stop the writer thread."""
+        if self._running:
+            self.listener.stop()
+            self._running = False
+
+    def sampled(self):
+        """Whether this request's record should be logged."""
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    def stats(self):
+        return {
+            "level": logging.getLevelName(self.level),
+            "sample_rate": self.sample_rate,
+            "queued": self.queue.qsize(),
+            "max_queue": self.queue.maxsize,
+            "dropped": self.handler.dropped,
+        }
+
+
+class StageTimer:
+    """
+    Latency breakdown of one request: mark(stage) charges the time elapsed since
+    the previous mark to that stage.
+    """
+    __slots__ = ("started", "last", "stages")
+
+    def __init__(self):
+        self.started = self.last = time.perf_counter()
+        self.stages = {}
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.0) + (now - self.last)
+        self.last = now
+
+    def as_dict(self):
+        """Stage durations and total, in milliseconds."""
+        breakdown = {stage: round(seconds * 1000, 3) for stage, seconds in self.stages.items()}
+        breakdown["total"] = round((time.perf_counter() - self.started) * 1000, 3)
+        return breakdown
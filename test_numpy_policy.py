@@ -0,0 +1,19 @@
+"""
+Parity of the NumPy policy export (numpy_policy.py) with PPO's deterministic predict.
+
+    python -m pytest test_numpy_policy.py
+"""
+import glob
+import os
+import pytest
+from numpy_policy import check_parity, export_policy
+
+ATOL = 1e-3
+CHECKPOINTS = sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "PPO", "*.zip")))
+
+
+@pytest.mark.parametrize("model_path", CHECKPOINTS, ids=os.path.basename)
+def test_export_matches_ppo_predict(model_path, tmp_path):
+    npz_path = export_policy(model_path, str(tmp_path / "policy.npz"))
+    # check_parity raises if the action means or the clipped actions differ by more than atol
+    assert check_parity(model_path, npz_path, atol=ATOL) <= ATOL
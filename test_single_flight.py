@@ -0,0 +1,54 @@
+"""
+Single-flight and the circuit breaker (api.infer_within_budget).
+
+    python -m pytest test_single_flight.py
+"""
+import asyncio
+import time
+import api
+from circuit_breaker import CircuitBreaker
+from single_flight import SingleFlight
+
+
+def run_burst(monkeypatch, n, forward_seconds, breaker):
+    """n identical concurrent calls of a forward pass taking forward_seconds."""
+    monkeypatch.setattr(api, "breaker", breaker)
+    monkeypatch.setattr(api, "single_flight", SingleFlight())
+    passes = []
+
+    async def forward():
+        passes.append(1)
+        await asyncio.sleep(forward_seconds)
+        return 1234.0
+
+    async def burst():
+        deadline = time.perf_counter() + 5.0
+        return await asyncio.gather(*(
+            api.infer_within_budget(forward, deadline, "/predict", flight_key="same-trip") for _ in range(n)
+        ))
+
+    return asyncio.run(burst()), len(passes)
+
+
+def test_collapsed_burst_is_one_breaker_call(monkeypatch):
+    # Every call is slow: 20 recorded calls would open the breaker
+    breaker = CircuitBreaker(window=50, min_calls=20, slow_call_seconds=0.01)
+    results, passes = run_burst(monkeypatch, 100, 0.05, breaker)
+
+    assert passes == 1
+    assert results == [(1234.0, None)] * 100
+    assert api.single_flight.stats()["collapsed"] == 99
+    assert breaker.stats()["calls_in_window"] == 1
+    assert breaker.state == "closed"
+
+
+def test_followers_do_not_take_half_open_probes(monkeypatch):
+    breaker = CircuitBreaker(min_calls=1, open_seconds=0.0, half_open_calls=1)
+    breaker._open()
+    results, passes = run_burst(monkeypatch, 10, 0.0, breaker)
+
+    # The leader is the single probe and closes the breaker; nobody is rejected
+    assert passes == 1
+    assert results == [(1234.0, None)] * 10
+    assert breaker.state == "closed"
+    assert breaker.stats()["rejected"] == 0
@@ -1,9 +1,10 @@
 import gymnasium as gym
 from stable_baselines3 import PPO
-from stable_baselines3.common.env_util import make_vec_env
 from stable_baselines3.common.callbacks import EvalCallback
+import argparse
 import os
-from env import TravelCostEnv
+from normalization import Normalization
+from vec_env import make_training_env, ppo_batch_params
 
 # Create directories
 models_dir = "models/PPO"
@@ -11,10 +12,13 @@ log_dir = "logs"
 os.makedirs(models_dir, exist_ok=True)
 os.makedirs(log_dir, exist_ok=True)
 
-def train():
+def train(vec_envs=256, seed=None, workers=1, normalize=False):
     print("Initializing Environment...")
-    # Instantiate the env
-    env = TravelCostEnv()
+    # Instantiate the env: vec_envs trips stepped together (vec_env.py), split across
+    # `workers` subprocesses, or one TravelCostEnv if vec_envs is 0; optionally
+    # behind the normalisation layer, saved with every checkpoint (normalization.py)
+    normalization = Normalization() if normalize else None
+    env = make_training_env(vec_envs, seed=seed, workers=workers, normalization=normalization)
     
     # Reset to check if it works
     env.reset()
@@ -27,9 +31,9 @@ def train():
         verbose=1, 
         tensorboard_log=log_dir,
         learning_rate=0.0003,
-        n_steps=2048,
-        batch_size=64,
-        gamma=0.99
+        **ppo_batch_params(env, 2048), # ~2048 samples per update in minibatches of 64, as with one env
+        gamma=0.99,
+        seed=seed
     )
     
     print("Starting Training...")
@@ -38,6 +42,8 @@ def train():
     for i in range(1, 11): # Train for 10 * 10000 = 100k steps
         model.learn(total_timesteps=TIMESTEPS, reset_num_timesteps=False, tb_log_name="PPO")
         model.save(f"{models_dir}/{TIMESTEPS*i}")
+        if normalization is not None:
+            normalization.save(f"{models_dir}/{TIMESTEPS*i}")
         print(f"Saved model at {TIMESTEPS*i} steps")
 
     print("Training Complete.")
@@ -45,4 +51,10 @@ def train():
     return model
 
 if __name__ == "__main__":
-    train()
+    parser = argparse.ArgumentParser(description="Train the PPO agent")
+    parser.add_argument("--vec-envs", type=int, default=256, help="Trips stepped together by TravelCostVecEnv (0: one TravelCostEnv, default: 256)")
+    parser.add_argument("--workers", type=int, default=1, help="Split the --vec-envs trips across this many subprocesses (default: 1; only faster with spare cores and a large --vec-envs)")
+    parser.add_argument("--normalize", action="store_true", help="Train behind the normalisation layer (normalization.py)")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    train(vec_envs=args.vec_envs, seed=args.seed, workers=args.workers, normalize=args.normalize)
@@ -0,0 +1,339 @@
+"""
+Native vectorized TravelCostEnv for Stable-Baselines3.
+
+TravelCostEnv is a contextual bandit: every step terminates the episode. Wrapped
+in a DummyVecEnv, each sample still costs a Python reset() and step(), a few
+small np.array allocations and the VecEnv bookkeeping, so PPO spends most of its
+time in the environment. TravelCostVecEnv keeps the same observations, rewards
+and scenario distribution for `num_envs` trips at once: it samples them into a
+preallocated buffer (simulation.sample_trips), scores all the actions with
+array math and resets every environment in bulk after each step.
+ShardedVecEnv splits those trips across subprocesses, one shard per core.
+
+    env = VecMonitor(TravelCostVecEnv(num_envs=256, seed=0))
+    model = PPO("MlpPolicy", env, n_steps=64)
+
+Measure with: python vec_env.py
+"""
+import math
+import multiprocessing
+import time
+import numpy as np
+from gymnasium import spaces
+from stable_baselines3.common.monitor import Monitor
+from stable_baselines3.common.vec_env import DummyVecEnv, VecEnv, VecEnvWrapper, VecMonitor
+from env import TravelCostEnv
+from simulation import sample_trips
+
+
+def travel_cost_rewards(predicted, actual):
+    """Vectorized TravelCostEnv.step() reward: -error/100, +100 within 500 CFA, else +20 within 10%."""
+    error = np.abs(predicted - actual)
+    rewards = -(error / 100.0)
+    rewards += np.where(error < 500, 100.0, np.where(error < 0.1 * actual, 20.0, 0.0))
+    return rewards.astype(np.float32), error
+
+
+class TravelCostVecEnv(VecEnv):
+    """
+    `num_envs` TravelCostEnv trips stepped together. With `feedback_data`
+    (the list TravelCostEnv takes), the trips cycle through the recorded
+    feedback in order, from `feedback_offset`, instead of being simulated.
+    """
+
+    def __init__(self, num_envs=256, feedback_data=None, seed=None, feedback_offset=0):
+        template = TravelCostEnv()
+        self.render_mode = None
+        super().__init__(num_envs, template.observation_space, template.action_space)
+        self.rng = np.random.default_rng(seed)
+        self.feedback_observations = None
+        if feedback_data:
+            self.feedback_observations = np.array([sample["observation"] for sample in feedback_data], dtype=np.float32)
+            self.feedback_costs = np.array([sample["actual_cost"] for sample in feedback_data], dtype=np.float64)
+        self.feedback_index = feedback_offset
+        self._observations = np.empty((num_envs, 8), dtype=np.float32)
+        self._costs = np.empty(num_envs, dtype=np.float64)
+        self._dones = np.ones(num_envs, dtype=bool) # every step ends the episode
+        self._actions = None
+        self.last_predicted = self.last_actual = self.last_errors = None
+
+    def _sample(self):
+        """Draw the next num_envs trips into the buffers; returns a copy of the observations."""
+        if self.feedback_observations is None:
+            _, costs = sample_trips(self.num_envs, self.rng, out=self._observations)
+            self._costs[:] = costs
+        else:
+            index = (self.feedback_index + np.arange(self.num_envs)) % len(self.feedback_costs)
+            np.take(self.feedback_observations, index, axis=0, out=self._observations)
+            np.take(self.feedback_costs, index, out=self._costs)
+            self.feedback_index += self.num_envs
+        # The caller keeps the returned array (PPO stores it after the next step): never hand out the buffer
+        return self._observations.copy()
+
+    def reset(self):
+        if self._seeds[0] is not None:
+            self.rng = np.random.default_rng(self._seeds[0])
+        self._reset_seeds()
+        self._reset_options()
+        self._last_observations = self._sample()
+        return self._last_observations
+
+    def step_async(self, actions):
+        self._actions = actions
+
+    def step_wait(self):
+        # Per-env dicts cost more than the whole step: the infos only carry what SB3
+        # needs, the predicted/actual/error of TravelCostEnv's info are the last_* arrays
+        infos = [{"terminal_observation": obs} for obs in self._last_observations]
+        rewards = self._score(self._actions)
+        return self._last_observations, rewards, self._dones.copy(), infos
+
+    def _score(self, actions):
+        """Rewards of the actions for the current trips; draws the next trips."""
+        predicted = np.asarray(actions, dtype=np.float64).reshape(self.num_envs, -1)[:, 0]
+        self.last_predicted, self.last_actual = predicted, self._costs.copy()
+        rewards, self.last_errors = travel_cost_rewards(predicted, self.last_actual)
+        self._last_observations = self._sample()
+        return rewards
+
+    def close(self):
+        pass
+
+    def _indices(self, indices):
+        if indices is None:
+            return range(self.num_envs)
+        if isinstance(indices, int):
+            return [indices]
+        return indices
+
+    def get_attr(self, attr_name, indices=None):
+        value = getattr(self, attr_name)
+        return [value for _ in self._indices(indices)]
+
+    def set_attr(self, attr_name, value, indices=None):
+        setattr(self, attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        result = getattr(self, method_name)(*method_args, **method_kwargs)
+        return [result for _ in self._indices(indices)]
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self._indices(indices)]
+
+
+def _shard_worker(remote, parent_remote, num_envs, feedback_data, feedback_offset, seed):
+    parent_remote.close()
+    env = TravelCostVecEnv(num_envs, feedback_data=feedback_data, seed=seed, feedback_offset=feedback_offset)
+    try:
+        while True:
+            command, data = remote.recv()
+            if command == "step":
+                rewards = env._score(data)
+                remote.send((env._last_observations, rewards))
+            elif command == "reset":
+                if data is not None:
+                    env.seed(data)
+                remote.send(env.reset())
+            elif command == "close":
+                break
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        remote.close()
+
+
+class ShardedVecEnv(VecEnv):
+    """
+    TravelCostVecEnv split into `workers` shards stepped in subprocesses: one
+    pipe message per shard and step carries all its actions, observations and
+    rewards. Shard k holds envs [start_k, start_k + size_k), is seeded
+    seed + start_k (OS entropy when seed is None) and starts at its own share
+    of the feedback data.
+    """
+
+    def __init__(self, num_envs=256, workers=2, feedback_data=None, seed=None):
+        if num_envs < workers:
+            raise ValueError(f"{workers} workers need at least as many envs (got {num_envs})")
+        template = TravelCostEnv()
+        self.render_mode = None
+        super().__init__(num_envs, template.observation_space, template.action_space)
+        sizes = [num_envs // workers + (rank < num_envs % workers) for rank in range(workers)]
+        self.starts = np.cumsum([0] + sizes[:-1]).tolist()
+        self.splits = np.cumsum(sizes[:-1]).tolist()
+        samples = len(feedback_data) if feedback_data else 0
+        # forkserver (spawn elsewhere) as SubprocVecEnv: forking a process that runs torch is not safe
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+        self.remotes, self.processes = [], []
+        for rank, (start, size) in enumerate(zip(self.starts, sizes)):
+            remote, worker_remote = context.Pipe()
+            args = (worker_remote, remote, size, feedback_data, rank * samples // workers,
+                    None if seed is None else seed + start)
+            process = context.Process(target=_shard_worker, args=args, daemon=True)
+            process.start()
+            worker_remote.close()
+            self.remotes.append(remote)
+            self.processes.append(process)
+        self._dones = np.ones(num_envs, dtype=bool)
+        self._last_observations = None
+        self.closed = False
+
+    def reset(self):
+        for remote, start in zip(self.remotes, self.starts):
+            remote.send(("reset", self._seeds[start]))
+        self._reset_seeds()
+        self._reset_options()
+        self._last_observations = np.concatenate([remote.recv() for remote in self.remotes])
+        return self._last_observations
+
+    def step_async(self, actions):
+        for remote, shard in zip(self.remotes, np.split(np.asarray(actions), self.splits)):
+            remote.send(("step", shard))
+
+    def step_wait(self):
+        results = [remote.recv() for remote in self.remotes]
+        infos = [{"terminal_observation": obs} for obs in self._last_observations]
+        self._last_observations = np.concatenate([obs for obs, _ in results])
+        rewards = np.concatenate([rewards for _, rewards in results])
+        return self._last_observations, rewards, self._dones.copy(), infos
+
+    def close(self):
+        if self.closed:
+            return
+        for remote in self.remotes:
+            try:
+                remote.send(("close", None))
+            except (BrokenPipeError, EOFError):
+                pass
+        for process in self.processes:
+            process.join()
+        self.closed = True
+
+    def _indices(self, indices):
+        if indices is None:
+            return range(self.num_envs)
+        if isinstance(indices, int):
+            return [indices]
+        return indices
+
+    def get_attr(self, attr_name, indices=None):
+        value = getattr(self, attr_name)
+        return [value for _ in self._indices(indices)]
+
+    def set_attr(self, attr_name, value, indices=None):
+        setattr(self, attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        result = getattr(self, method_name)(*method_args, **method_kwargs)
+        return [result for _ in self._indices(indices)]
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self._indices(indices)]
+
+
+class NormalizeVecEnv(VecEnvWrapper):
+    """
+    Puts a normalization.Normalization between a TravelCostEnv VecEnv and the
+    policy: standardised observations, actions in [-1, 1] mapped to FCFA,
+    rewards divided by their running std. With training=True the statistics
+    are updated with every batch; otherwise they are used as saved.
+    """
+
+    def __init__(self, venv, normalization, training=True):
+        clip = normalization.clip_obs
+        super().__init__(
+            venv,
+            observation_space=spaces.Box(-clip, clip, shape=venv.observation_space.shape, dtype=np.float32),
+            action_space=spaces.Box(-1.0, 1.0, shape=venv.action_space.shape, dtype=np.float32),
+        )
+        self.normalization = normalization
+        self.training = training
+
+    def reset(self):
+        obs = self.venv.reset()
+        if self.training:
+            self.normalization.obs_rms.update(obs)
+        return self.normalization.normalize_obs(obs)
+
+    def step_async(self, actions):
+        self.venv.step_async(self.normalization.action_to_cost(actions))
+
+    def step_wait(self):
+        obs, rewards, dones, infos = self.venv.step_wait()
+        if self.training:
+            self.normalization.obs_rms.update(obs)
+            self.normalization.reward_rms.update(rewards)
+        for info in infos:
+            if "terminal_observation" in info:
+                info["terminal_observation"] = self.normalization.normalize_obs(info["terminal_observation"])
+        return self.normalization.normalize_obs(obs), self.normalization.scale_reward(rewards), dones, infos
+
+
+def normalize_env(env, normalization, training=True):
+    """Wrap a TravelCostEnv (in a monitored DummyVecEnv) or a VecEnv in NormalizeVecEnv."""
+    if not isinstance(env, VecEnv):
+        env = DummyVecEnv([lambda: Monitor(env)])
+    return NormalizeVecEnv(env, normalization, training=training)
+
+
+def make_training_env(num_envs=256, feedback_data=None, seed=None, workers=1, normalization=None):
+    """
+    Training env for PPO:
+      - num_envs > 0: TravelCostVecEnv wrapped in VecMonitor (episode rewards in the logs),
+        split into `workers` ShardedVecEnv subprocesses when workers > 1;
+      - otherwise one TravelCostEnv as before.
+    With a normalization.Normalization, the env is wrapped in NormalizeVecEnv
+    (the monitors still log raw rewards).
+    """
+    if not num_envs:
+        if workers > 1:
+            raise ValueError("workers > 1 needs vectorized envs (num_envs > 0)")
+        env = TravelCostEnv(feedback_data=feedback_data)
+    elif workers > 1:
+        env = VecMonitor(ShardedVecEnv(num_envs=num_envs, workers=workers, feedback_data=feedback_data, seed=seed))
+    else:
+        env = VecMonitor(TravelCostVecEnv(num_envs=num_envs, feedback_data=feedback_data, seed=seed))
+    if normalization is not None:
+        env = normalize_env(env, normalization)
+    return env
+
+
+def ppo_batch_params(env, rollout_size=2048, minibatches=32):
+    """
+    PPO n_steps and batch_size for the number of envs: about `rollout_size`
+    samples per update (one step of every env when there are more envs than
+    that), split into about `minibatches` power-of-two minibatches of at least
+    64 samples. n_steps is rounded so that batch_size divides the rollout when
+    that does not inflate it; otherwise SB3 truncates the last minibatch.
+    """
+    num_envs = getattr(env, "num_envs", 1)
+    steps = max(1.0, rollout_size / num_envs)
+    batch_size = max(64, 2 ** round(math.log2(max(1, steps * num_envs / minibatches))))
+    unit = batch_size // math.gcd(batch_size, num_envs)
+    n_steps = max(unit, round(steps / unit) * unit)
+    if n_steps > 2 * steps:
+        n_steps = round(steps)
+    return {"n_steps": n_steps, "batch_size": batch_size}
+
+
+def steps_per_second(env, seconds=2.0):
+    """Environment-only throughput with random actions (steps of all envs per second)."""
+    env.reset()
+    actions = np.stack([env.action_space.sample() for _ in range(env.num_envs)])
+    steps = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        env.step(actions)
+        steps += env.num_envs
+    return steps / (time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    dummy = DummyVecEnv([TravelCostEnv for _ in range(8)])
+    print(f"DummyVecEnv(8 x TravelCostEnv): {steps_per_second(dummy):,.0f} steps/s")
+    for n in (256, 4096):
+        print(f"TravelCostVecEnv({n}): {steps_per_second(TravelCostVecEnv(num_envs=n, seed=0)):,.0f} steps/s")
+    for workers in (2, 4):
+        sharded = ShardedVecEnv(num_envs=4096, workers=workers, seed=0)
+        print(f"ShardedVecEnv(4096, {workers} workers): {steps_per_second(sharded):,.0f} steps/s")
+        sharded.close()